@@ -0,0 +1,129 @@
+"""Compare post-session cost of the old TS-in-.mp4 output with live fMP4 muxing.
+
+The old recorder wrote MPEG-TS into ``.mp4`` files, so after the show a full
+``ffmpeg -c copy -movflags +faststart`` pass was needed to get a seekable,
+streamable MP4. The recorder now pipes yt-dlp through ffmpeg while recording
+(``RecorderManager._run_muxed``) and writes ffmpeg's output with
+``_write_stream``, leaving only the final fragment to flush at stop.
+
+The benchmark synthesizes a ``--seconds`` long stream, replays it through the
+real recorder pipeline at ``--speed`` times real time (a paced reader stands in
+for yt-dlp) and reports, for both approaches, the bytes written to disk after
+the stream ends and the time from end of stream until the file is ready to
+upload. Written bytes come from the kernel's block I/O accounting
+(``getrusage``); reads are not shown because they are served from the page
+cache here::
+
+    python bench_mux.py --seconds 600 --ffmpeg /usr/bin/ffmpeg
+
+The synthetic stream is MPEG-TS like yt-dlp's; ``--container matroska`` swaps
+it for builds whose TS demuxer is unavailable. Both paths copy the same
+packets, so the container barely changes the comparison.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import recorder
+from config import FFMPEG_PATH
+
+# Stand-in for 'yt-dlp -o -': writes the file to stdout at a steady rate.
+_PACED_SOURCE = """\
+import sys, time
+path, rate = sys.argv[1], float(sys.argv[2])
+started = time.monotonic()
+sent = 0
+with open(path, "rb") as fh:
+    for chunk in iter(lambda: fh.read(64 * 1024), b""):
+        sys.stdout.buffer.write(chunk)
+        sent += len(chunk)
+        ahead = sent / rate - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+"""
+
+
+def _written_bytes() -> int:
+    """Bytes written to disk so far by this process and its reaped children."""
+    blocks = sum(
+        resource.getrusage(who).ru_oublock for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    )
+    return blocks * 512
+
+
+def _make_stream(ffmpeg: str, path: Path, seconds: int, container: str) -> None:
+    subprocess.run(
+        [
+            ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds}",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-g", "60",
+            "-c:a", "aac", "-f", container, str(path),
+        ],
+        check=True,
+    )
+
+
+def _legacy(ffmpeg: str, ts_file: Path, out: Path) -> tuple[float, int]:
+    """Remux pass the old output needed; returns (seconds, bytes written)."""
+    written = _written_bytes()
+    started = time.perf_counter()
+    subprocess.run(
+        [
+            ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+            "-i", str(ts_file), "-c", "copy", "-movflags", "+faststart", str(out),
+        ],
+        check=True,
+    )
+    return time.perf_counter() - started, _written_bytes() - written
+
+
+async def _live(ts_file: Path, out: Path, seconds: int, speed: float) -> tuple[float, int]:
+    """Record the stream through the recorder pipeline; returns (seconds after EOF, bytes written after EOF)."""
+    manager = recorder.RecorderManager()
+    rate = ts_file.stat().st_size / seconds * speed
+    source, muxer = await manager._run_muxed(sys.executable, "-c", _PACED_SOURCE, str(ts_file), str(rate))
+    writer = asyncio.create_task(manager._write_stream(muxer.stdout, out))
+    await source.wait()
+    started = time.perf_counter()  # end of stream: the show is over
+    written = _written_bytes()
+    _, mux_err = await asyncio.gather(muxer.wait(), muxer.stderr.read())
+    await writer
+    if muxer.returncode != 0:
+        raise RuntimeError(f"ffmpeg terminó con código {muxer.returncode}: {mux_err.decode(errors='ignore')}")
+    return time.perf_counter() - started, _written_bytes() - written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=int, default=300, help="length of the synthetic stream")
+    parser.add_argument("--speed", type=float, default=20.0, help="replay speed, in multiples of real time")
+    parser.add_argument("--ffmpeg", default=FFMPEG_PATH, help="ffmpeg executable")
+    parser.add_argument("--container", default="mpegts", help="container of the synthetic stream")
+    args = parser.parse_args()
+    recorder.FFMPEG_PATH = args.ffmpeg
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        ts_file = tmp_path / "session.ts"
+        _make_stream(args.ffmpeg, ts_file, args.seconds, args.container)
+        size_mb = ts_file.stat().st_size / 1e6
+
+        legacy_time, legacy_bytes = _legacy(args.ffmpeg, ts_file, tmp_path / "legacy.mp4")
+        live_time, live_bytes = asyncio.run(_live(ts_file, tmp_path / "live.mp4", args.seconds, args.speed))
+
+        print(f"stream: {args.seconds}s, {size_mb:.1f} MB")
+        print(f"{'approach':<18} {'post-session MB':>16} {'ready after (s)':>16}")
+        print(f"{'remux (legacy)':<18} {legacy_bytes / 1e6:>16.1f} {legacy_time:>16.2f}")
+        print(f"{'live fMP4':<18} {live_bytes / 1e6:>16.1f} {live_time:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Measure how recorder throughput scales with the number of shards.
+
+Each simulated recording runs a fake ``yt-dlp`` that streams media through a
+pass-through ``ffmpeg`` muxer, which the shard's event loop copies to disk
+while hashing it. The
+benchmark starts ``--models`` recordings and reports how long it takes every
+shard count from 1 to ``--max-shards`` to drain them all::
+
+    python bench_shards.py --max-shards 8 --models 64 --megabytes 32
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from shards import ShardedRecorder
+
+_FAKE_YTDLP = """\
+import sys
+if "-J" in sys.argv:
+    print("{{}}")
+    sys.exit(0)
+chunk = bytes(range(256)) * 256
+remaining = {size}
+while remaining > 0:
+    sys.stdout.buffer.write(chunk)
+    remaining -= len(chunk)
+sys.stdout.flush()
+"""
+
+
+def _configure(ytdlp_path: str, ffmpeg_path: str, output_dir: str) -> None:
+    """Shard initializer pointing the recorder at the fake tools."""
+    import recorder
+
+    recorder.YTDLP_PATH = ytdlp_path
+    recorder.FFMPEG_PATH = ffmpeg_path
+    recorder.OUTPUT_DIR = output_dir
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _write_fake_ffmpeg(directory: Path) -> Path:
+    launcher = directory / "ffmpeg"
+    launcher.write_text("#!/bin/sh\nexec cat\n")
+    launcher.chmod(0o755)
+    return launcher
+
+
+def _write_fake_ytdlp(directory: Path, size: int) -> Path:
+    script = directory / "fake_ytdlp.py"
+    script.write_text(_FAKE_YTDLP.format(size=size))
+    launcher = directory / "yt-dlp"
+    launcher.write_text(f"#!/bin/sh\nexec {sys.executable} {script} \"$@\"\n")
+    launcher.chmod(0o755)
+    return launcher
+
+
+async def _run(shards: int, models: int, ytdlp: Path, ffmpeg: Path, output_dir: Path) -> float:
+    async with ShardedRecorder(shards, _configure, (str(ytdlp), str(ffmpeg), str(output_dir))) as rec:
+        started = time.perf_counter()
+        for i in range(models):
+            await rec.start_recording(f"http://example.com/m{i}", f"m{i}")
+        # a recording is registered before its fake yt-dlp creates the output,
+        # so once every file exists an empty listing means all have drained
+        while len(list(output_dir.glob("*.mp4"))) < models or await rec.list_recordings():
+            await asyncio.sleep(0.05)
+        return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--models", type=int, default=32)
+    parser.add_argument("--megabytes", type=int, default=16, help="media per recording")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        ytdlp = _write_fake_ytdlp(tmp_path, args.megabytes * 1024 * 1024)
+        ffmpeg = _write_fake_ffmpeg(tmp_path)
+        baseline = None
+        print(f"{'shards':>6} {'seconds':>9} {'speedup':>8}")
+        for shards in range(1, args.max_shards + 1):
+            output_dir = tmp_path / f"shards{shards}"
+            output_dir.mkdir()
+            elapsed = asyncio.run(_run(shards, args.models, ytdlp, ffmpeg, output_dir))
+            baseline = baseline or elapsed
+            print(f"{shards:>6} {elapsed:>9.2f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Content-addressed cache for downloaded media.
+
+Downloads are looked up by a *request key* derived from the normalized URL and
+the requested format. Each key points at an *object*, a file stored under the
+SHA-256 of its content, so identical media reached through different URLs is
+kept only once. Objects are handed out as hardlinks and evicted least recently
+used first once the cache exceeds its size bound.
+
+Layout under ``root``::
+
+    index.json              request keys, object sizes and access times
+    objects/ab/abcdef….mp4  content-addressed files
+    partial/<key>/          in-progress downloads, kept to resume them
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config import CACHE_DIR, CACHE_MAX_GB
+from fs_utils import ensure_directory, hash_file
+
+__all__ = ["DownloadCache", "normalize_url"]
+
+# Query parameters that never change the media a URL points at.
+_TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "si", "feature"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Return a canonical form of *url* for cache lookups.
+
+    Scheme and host are lowercased, default ports, fragments, trailing slashes
+    and tracking parameters (``utm_*``, ``fbclid``...) are dropped and the
+    remaining query parameters are sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+class DownloadCache:
+    """Size-bounded, content-addressed store of completed downloads."""
+
+    def __init__(self, root: Path | str = CACHE_DIR, max_bytes: int = CACHE_MAX_GB * 1024 ** 3) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index_path = self.root / "index.json"
+        ensure_directory(self.root / "objects")
+        ensure_directory(self.root / "partial")
+        self._index = self._load()
+
+    @staticmethod
+    def key(url: str, fmt: Optional[str] = None) -> str:
+        """Return the request key for *url* downloaded with format *fmt*."""
+        raw = f"{normalize_url(url)}\0{fmt or ''}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            data = json.loads(self._index_path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        return {"keys": data.get("keys", {}), "objects": data.get("objects", {})}
+
+    def _save(self) -> None:
+        tmp = self._index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._index))
+        os.replace(tmp, self._index_path)
+
+    def _object_path(self, digest: str, suffix: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}{suffix}"
+
+    @property
+    def size(self) -> int:
+        """Total bytes held by cached objects."""
+        return sum(o["size"] for o in self._index["objects"].values())
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the cached object for *key*, or ``None`` on a miss."""
+        digest = self._index["keys"].get(key)
+        obj = self._index["objects"].get(digest) if digest else None
+        if obj is None:
+            return None
+        path = self._object_path(digest, obj["suffix"])
+        if not path.exists():
+            self._forget(digest)
+            self._save()
+            return None
+        obj["atime"] = time.time()
+        self._save()
+        return path
+
+    def partial_dir(self, key: str) -> Path:
+        """Directory where an unfinished download for *key* is kept."""
+        path = self.root / "partial" / key
+        ensure_directory(path)
+        return path
+
+    def store(self, key: str, path: Path, digest: Optional[str] = None) -> Path:
+        """Move the finished download *path* into the cache under *key*.
+
+        The index is not thread-safe, so call this from the event loop and
+        compute *digest* (the SHA-256 of *path*) in a worker thread first;
+        without it the file is hashed here, blocking the caller.
+        """
+        if digest is None:
+            digest = hash_file(path)
+        target = self._object_path(digest, path.suffix)
+        if target.exists():
+            path.unlink()  # same content already cached under another key
+        else:
+            ensure_directory(target.parent)
+            os.replace(path, target)
+        self._index["keys"][key] = digest
+        self._index["objects"][digest] = {
+            "size": target.stat().st_size,
+            "suffix": path.suffix,
+            "atime": time.time(),
+        }
+        self.evict(keep=digest)
+        self._save()
+        shutil.rmtree(self.root / "partial" / key, ignore_errors=True)
+        return target
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Drop least recently used objects until the cache fits ``max_bytes``."""
+        objects = self._index["objects"]
+        total = self.size
+        for digest in sorted(objects, key=lambda d: objects[d]["atime"]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            total -= objects[digest]["size"]
+            logging.info("🧹 Cache: expulsando %s (%s bytes)", digest[:12], objects[digest]["size"])
+            self._forget(digest)
+
+    def _forget(self, digest: str) -> None:
+        obj = self._index["objects"].pop(digest, None)
+        if obj is not None:
+            self._object_path(digest, obj["suffix"]).unlink(missing_ok=True)
+        self._index["keys"] = {k: d for k, d in self._index["keys"].items() if d != digest}
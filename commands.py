@@ -6,22 +6,78 @@ actual business logic is expected to live in other modules (``upload``,
 """
 from __future__ import annotations
 
-from typing import Iterable
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional, Set, Tuple
+from urllib.parse import urlparse
 
 from telethon import events, TelegramClient
+from telethon.errors import RPCError
 
-from config import AUTHORIZED_USERS
+from config import AUTHORIZED_USERS, CLIP_DURATION, OUTPUT_DIR
+from fs_utils import sanitize_filename
+from ingest import download
+from progress import ProgressReporter, report_elapsed, report_recording, upload_progress
+from shards import ShardError, ShardedRecorder
 from task_queue import TaskQueue, Task
+from upload import upload_file
 
 __all__ = ["register_handlers"]
 
+STREAM_BASE_URL = "https://chaturbate.com"
+
 async def _is_authorized(event: events.NewMessage.Event) -> bool:
     """Check whether the sender of *event* is authorized."""
     sender = await event.get_sender()
     return bool(sender and getattr(sender, "id", None) in AUTHORIZED_USERS)
 
-def register_handlers(client: TelegramClient, queue: TaskQueue) -> None:
-    """Register all command handlers on the given *client*."""
+def _parse_target(arg: str) -> Tuple[str, str]:
+    """Return ``(model_name, url)`` for a channel name or stream URL."""
+    arg = arg.strip()
+    if arg.startswith(("http://", "https://")):
+        parts = [p for p in urlparse(arg).path.split("/") if p]
+        name = parts[-1] if parts else urlparse(arg).netloc
+        return sanitize_filename(name), arg
+    name = sanitize_filename(arg.strip("/"))
+    return name, f"{STREAM_BASE_URL}/{name}/"
+
+# Returned by a recorder call that failed and already replied with the error;
+# unlike ``None`` it cannot be mistaken for an operation's own result.
+_FAILED = object()
+
+def _format_listing(title: str, items: dict) -> str:
+    """Render a ``model -> detail`` mapping for a reply."""
+    lines = "\n".join(f"• {k}: {v}" for k, v in sorted(items.items())) or "(ninguno)"
+    return f"{title}\n{lines}"
+
+def register_handlers(
+    client: TelegramClient,
+    queue: TaskQueue,
+    recorder: Optional[ShardedRecorder] = None,
+    progress: Optional[ProgressReporter] = None,
+) -> None:
+    """Register all command handlers on the given *client*.
+
+    Recording commands are forwarded to *recorder*, which runs the
+    ``RecorderManager`` shards in separate processes. Long-running commands
+    report through *progress* when given.
+    """
+
+    # /record status updates run until their recording ends
+    status_tasks: Set[asyncio.Task] = set()
+
+    async def _recorder_call(event: events.NewMessage.Event, op: str, *args, **kwargs):
+        """Invoke *op* on the recorder, replying with an error and returning
+        ``_FAILED`` on failure."""
+        if recorder is None:
+            await event.reply("⚠️ Grabador no disponible")
+            return _FAILED
+        try:
+            return await getattr(recorder, op)(*args, **kwargs)
+        except ShardError as ex:
+            await event.reply(f"⚠️ Error del grabador: {ex}")
+            return _FAILED
 
     @client.on(events.NewMessage(pattern="/upload"))
     async def cmd_upload(event: events.NewMessage.Event) -> None:
@@ -37,7 +93,31 @@ def register_handlers(client: TelegramClient, queue: TaskQueue) -> None:
         if not await _is_authorized(event):
             await event.reply("❌ No autorizado")
             return
-        await event.reply("📥 Descarga en cola (función aún no implementada)")
+        url = event.pattern_match.group(1).strip()
+        output = Path(OUTPUT_DIR) / f"ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        label = "📥 Descargando"
+        message = await event.reply(f"{label}…")
+        handle = progress.track(message) if progress is not None else None
+        try:
+            if handle is None:
+                path = await download(url, output)
+            else:
+                path = await report_elapsed(handle, label, download(url, output))
+        except (RuntimeError, OSError) as ex:
+            if handle is None:
+                await event.reply(f"⚠️ {ex}")
+            else:
+                handle.done(f"⚠️ {ex}")
+            return
+        except BaseException:
+            # never leave the progress message ticking
+            if handle is not None:
+                handle.done("⚠️ Descarga interrumpida")
+            raise
+        if handle is None:
+            await event.reply(f"✅ Descarga lista: {path}")
+        else:
+            handle.done(f"{label}: listo", notice=f"✅ Descarga lista: {path}")
 
     @client.on(events.NewMessage(pattern=r"/clip\s+([0-9:]+-[0-9:]+)"))
     async def cmd_clip(event: events.NewMessage.Event) -> None:
@@ -47,13 +127,69 @@ def register_handlers(client: TelegramClient, queue: TaskQueue) -> None:
             return
         await event.reply("✂️ Clip solicitado (función aún no implementada)")
 
+    @client.on(events.NewMessage(pattern=r"/liveclip\s+(\S+)(?:\s+(\d+))?"))
+    async def cmd_liveclip(event: events.NewMessage.Event) -> None:
+        """Record a short clip from a live stream."""
+        if not await _is_authorized(event):
+            await event.reply("❌ No autorizado")
+            return
+        model, url = _parse_target(event.pattern_match.group(1))
+        duration = int(event.pattern_match.group(2) or CLIP_DURATION)
+        label = f"🎬 Grabando clip de {model}"
+        message = await event.reply(f"{label}…")
+        call = _recorder_call(event, "record_clip", url, model, duration)
+        if progress is None:
+            path = await call
+        else:
+            handle = progress.track(message)
+            path = await report_elapsed(handle, label, call, total=duration)
+            handle.done(f"{label}: listo" if path is not _FAILED else f"⚠️ Clip de {model} fallido")
+        if path is _FAILED:
+            return
+        path = Path(path)
+        if not path.is_file():
+            await event.reply(f"⚠️ Clip de {model} vacío")
+            return
+        handle = None
+        callback = None
+        if progress is not None:
+            handle = progress.track(await event.reply("📤 Subiendo clip…"))
+            callback = upload_progress(handle, "📤 Subiendo clip")
+        try:
+            # identical clips already sent are forwarded by reference
+            await upload_file(client, path, event.chat_id, caption=f"🎬 {model}", progress_callback=callback)
+        except (RPCError, OSError) as ex:
+            if handle is not None:
+                handle.done("⚠️ Subida fallida")
+            await event.reply(f"⚠️ No se pudo enviar el clip ({ex}); queda en {path}")
+            return
+        except BaseException:
+            if handle is not None:
+                handle.done("⚠️ Subida interrumpida")
+            raise
+        if handle is not None:
+            handle.done("📤 Clip enviado")
+
     @client.on(events.NewMessage(pattern=r"/record\s+(.+)"))
     async def cmd_record(event: events.NewMessage.Event) -> None:
         """Record a live stream."""
         if not await _is_authorized(event):
             await event.reply("❌ No autorizado")
             return
-        await event.reply("⏺️ Grabación en cola (función aún no implementada)")
+        model, url = _parse_target(event.pattern_match.group(1))
+        started = await _recorder_call(event, "start_recording", url, model)
+        if started is _FAILED:
+            return
+        if started:
+            message = await event.reply(f"⏺️ Grabando {model}")
+            if progress is not None:
+                task = asyncio.create_task(
+                    report_recording(progress.track(message), f"⏺️ {model}", lambda: recorder.recording_status(model))
+                )
+                status_tasks.add(task)
+                task.add_done_callback(status_tasks.discard)
+        else:
+            await event.reply(f"ℹ️ {model} ya se está grabando")
 
     @client.on(events.NewMessage(pattern=r"/monitor\s+(.+)"))
     async def cmd_monitor(event: events.NewMessage.Event) -> None:
@@ -61,7 +197,63 @@ def register_handlers(client: TelegramClient, queue: TaskQueue) -> None:
         if not await _is_authorized(event):
             await event.reply("❌ No autorizado")
             return
-        await event.reply("👀 Monitor en cola (función aún no implementada)")
+        model, url = _parse_target(event.pattern_match.group(1))
+        if await _recorder_call(event, "start_monitor", model, url) is _FAILED:
+            return
+        await event.reply(f"👀 Monitoreando {model}")
+
+    @client.on(events.NewMessage(pattern=r"/stop\s+(.+)"))
+    async def cmd_stop(event: events.NewMessage.Event) -> None:
+        """Stop the recording and monitor of a model."""
+        if not await _is_authorized(event):
+            await event.reply("❌ No autorizado")
+            return
+        model, _ = _parse_target(event.pattern_match.group(1))
+        monitor = await _recorder_call(event, "stop_monitor", model)
+        if monitor is _FAILED:
+            return
+        recording = await _recorder_call(event, "stop_recording", model)
+        if recording is _FAILED:
+            return
+        if monitor or recording:
+            await event.reply(f"⏹️ {model} detenido")
+        else:
+            await event.reply(f"ℹ️ {model} no estaba activo")
+
+    @client.on(events.NewMessage(pattern="/list"))
+    async def cmd_list(event: events.NewMessage.Event) -> None:
+        """List active recordings and monitors across all shards."""
+        if not await _is_authorized(event):
+            await event.reply("❌ No autorizado")
+            return
+        recordings = await _recorder_call(event, "list_recordings")
+        if recordings is _FAILED:
+            return
+        monitors = await _recorder_call(event, "list_monitors")
+        if monitors is _FAILED:
+            return
+        qualities = await _recorder_call(event, "list_qualities")
+        if qualities is _FAILED:
+            return
+        await event.reply(
+            _format_listing("⏺️ Grabaciones:", recordings)
+            + "\n\n"
+            + _format_listing("🎚️ Calidad:", qualities)
+            + "\n\n"
+            + _format_listing("👀 Monitores:", monitors)
+        )
+
+    @client.on(events.NewMessage(pattern=r"/priority\s+(\S+)\s+(-?\d+)"))
+    async def cmd_priority(event: events.NewMessage.Event) -> None:
+        """Set how long a model keeps its quality when the host is under load."""
+        if not await _is_authorized(event):
+            await event.reply("❌ No autorizado")
+            return
+        model, _ = _parse_target(event.pattern_match.group(1))
+        priority = int(event.pattern_match.group(2))
+        if await _recorder_call(event, "set_priority", model, priority) is _FAILED:
+            return
+        await event.reply(f"🎚️ Prioridad de {model}: {priority}")
 
     @client.on(events.NewMessage(pattern="/queue"))
     async def cmd_queue(event: events.NewMessage.Event) -> None:
@@ -91,8 +283,12 @@ def register_handlers(client: TelegramClient, queue: TaskQueue) -> None:
 /upload - Subir archivos
 /ingest <URL> - Descargar media
 /clip HH:MM:SS-HH:MM:SS - Crear clip
+/liveclip <URL|canal> [segundos] - Clip de un stream en vivo
 /record <URL|canal> - Grabar stream
 /monitor <URL|canal> - Vigilar y grabar
+/stop <URL|canal> - Detener grabación y monitor
+/list - Ver grabaciones y monitores activos
+/priority <URL|canal> <n> - Prioridad de calidad bajo carga
 /queue - Ver tareas pendientes
 /settings - Ajustes
 /help - Esta ayuda
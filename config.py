@@ -7,7 +7,7 @@ for backward compatibility with existing modules.
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Set
+from typing import Dict, Set
 
 @dataclass
 class BotConfig:
@@ -21,11 +21,30 @@ class BotConfig:
     MONITOR_POLL_INTERVAL: int = 60
     YTDLP_PATH: str = "yt-dlp"
     FFMPEG_PATH: str = "ffmpeg"
+    RECORDER_SHARDS: int = 1  # worker processes running RecorderManager
+
+    # Adaptive recording quality (see quality.py); capacities <= 0 disable a limit
+    QUALITY_NET_CAPACITY_MBIT: int = 1000
+    QUALITY_DISK_CAPACITY_MB: int = 200
+    QUALITY_HIGH_WATERMARK: float = 0.85
+    QUALITY_LOW_WATERMARK: float = 0.6
+    QUALITY_CHECK_INTERVAL: int = 30
+    MODEL_PRIORITIES: Dict[str, int] = field(default_factory=dict)  # higher = keep quality
+
+    CACHE_DIR: str = "cache"  # content-addressed download cache
+    CACHE_MAX_GB: int = 20
+    INGEST_CONCURRENT_FRAGMENTS: int = 8  # parallel HLS/DASH fragment downloads
+    FILE_REF_TTL_DAYS: int = 30  # reuse uploaded Telegram documents this long
+    FILE_REF_MAX_ENTRIES: int = 10000
 
     LOG_LEVEL: str = "INFO"  # DEBUG | INFO | WARNING | ERROR
     NORMAL_UPLOAD_LIMIT_GB: int = 2
     PREMIUM_UPLOAD_LIMIT_GB: int = 4
 
+    PROGRESS_EDIT_INTERVAL: float = 5.0  # seconds between edits of one message
+    PROGRESS_EDITS_PER_SECOND: float = 1.0  # global edit budget across chats
+    PROGRESS_BATCH_WINDOW: float = 3.0  # seconds to batch completion notices
+
 # Default configuration instance used by the application
 config = BotConfig()
 
@@ -39,4 +58,19 @@ CLIP_DURATION = config.CLIP_DURATION
 MONITOR_POLL_INTERVAL = config.MONITOR_POLL_INTERVAL
 YTDLP_PATH = config.YTDLP_PATH
 FFMPEG_PATH = config.FFMPEG_PATH
+RECORDER_SHARDS = config.RECORDER_SHARDS
+QUALITY_NET_CAPACITY_MBIT = config.QUALITY_NET_CAPACITY_MBIT
+QUALITY_DISK_CAPACITY_MB = config.QUALITY_DISK_CAPACITY_MB
+QUALITY_HIGH_WATERMARK = config.QUALITY_HIGH_WATERMARK
+QUALITY_LOW_WATERMARK = config.QUALITY_LOW_WATERMARK
+QUALITY_CHECK_INTERVAL = config.QUALITY_CHECK_INTERVAL
+MODEL_PRIORITIES = config.MODEL_PRIORITIES
+CACHE_DIR = config.CACHE_DIR
+CACHE_MAX_GB = config.CACHE_MAX_GB
+INGEST_CONCURRENT_FRAGMENTS = config.INGEST_CONCURRENT_FRAGMENTS
+FILE_REF_TTL_DAYS = config.FILE_REF_TTL_DAYS
+FILE_REF_MAX_ENTRIES = config.FILE_REF_MAX_ENTRIES
+PROGRESS_EDIT_INTERVAL = config.PROGRESS_EDIT_INTERVAL
+PROGRESS_EDITS_PER_SECOND = config.PROGRESS_EDITS_PER_SECOND
+PROGRESS_BATCH_WINDOW = config.PROGRESS_BATCH_WINDOW
 LOG_LEVEL = config.LOG_LEVEL
@@ -7,9 +7,23 @@ portable across platforms.
 from __future__ import annotations
 
 from pathlib import Path
+import hashlib
+import os
 import re
+import shutil
 
-__all__ = ["sanitize_filename", "ensure_directory"]
+__all__ = [
+    "sanitize_filename",
+    "ensure_directory",
+    "hash_file",
+    "link_or_copy",
+    "hash_sidecar_path",
+    "write_hash_sidecar",
+    "read_hash_sidecar",
+]
+
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_SIDECAR_SUFFIX = ".sha256"
 
 # Regex that matches any character not allowed in safe filenames.
 _SANITIZE_RE = re.compile(r"[^-_.() a-zA-Z0-9]")
@@ -25,3 +39,49 @@ def sanitize_filename(name: str) -> str:
 def ensure_directory(path: Path) -> None:
     """Create *path* if it doesn't exist."""
     path.mkdir(parents=True, exist_ok=True)
+
+def hash_file(path: Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Return the hex SHA-256 digest of the file at *path*."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_or_copy(src: Path, dst: Path) -> Path:
+    """Hardlink *src* to *dst*, copying instead when linking is not possible.
+
+    An existing *dst* is replaced. Copies happen across filesystems or on
+    filesystems without hardlink support.
+    """
+    ensure_directory(dst.parent)
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    return dst
+
+def hash_sidecar_path(path: Path) -> Path:
+    """Return the path of the file holding the content hash of *path*."""
+    return path.with_name(path.name + HASH_SIDECAR_SUFFIX)
+
+def write_hash_sidecar(path: Path, digest: str) -> None:
+    """Store *digest* as the known SHA-256 of *path*."""
+    hash_sidecar_path(path).write_text(digest + "\n")
+
+def read_hash_sidecar(path: Path) -> str | None:
+    """Return the stored SHA-256 of *path* if it is still current.
+
+    The sidecar is ignored when it is older than *path*, i.e. when the file
+    was modified after the hash was recorded.
+    """
+    sidecar = hash_sidecar_path(path)
+    try:
+        if sidecar.stat().st_mtime < path.stat().st_mtime:
+            return None
+        return sidecar.read_text().strip() or None
+    except OSError:
+        return None
@@ -1,25 +1,138 @@
 """Media ingestion helpers using yt-dlp.
 
-The real implementation should download external resources and validate that the
-resulting file matches expected codecs/containers before handing it over for
-further processing.
+Downloads go through a :class:`cache.DownloadCache`: a repeated request for the
+same normalized URL and format is served by hardlinking the cached file, and
+HLS/DASH fragments of new downloads are fetched concurrently. Unfinished
+downloads stay in the cache's ``partial`` directory so a retry resumes from the
+fragments already on disk.
 """
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import logging
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
-from config import YTDLP_PATH
+from cache import DownloadCache
+from config import INGEST_CONCURRENT_FRAGMENTS, YTDLP_PATH
+from fs_utils import hash_file, link_or_copy, write_hash_sidecar
 
 __all__ = ["download"]
 
-async def download(url: str, output: Path, fmt: Optional[str] = None) -> Path:
+_default_cache: Optional[DownloadCache] = None
+# One download per request key at a time; later callers get the cached file.
+# A lock is dropped once no caller holds or waits for it.
+_key_locks: Dict[str, asyncio.Lock] = {}
+_key_users: Dict[str, int] = {}
+
+
+def _get_cache() -> DownloadCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DownloadCache()
+    return _default_cache
+
+
+def _find_result(stdout: bytes, workdir: Path) -> Optional[Path]:
+    """Locate the finished file printed by yt-dlp, or the only one in *workdir*."""
+    for line in reversed(stdout.decode(errors="ignore").splitlines()):
+        candidate = Path(line.strip())
+        if line.strip() and candidate.is_file():
+            return candidate
+    files = [
+        p for p in workdir.iterdir()
+        if p.is_file() and not p.name.endswith((".part", ".ytdl")) and ".part-Frag" not in p.name
+    ]
+    return files[0] if len(files) == 1 else None
+
+
+def _deliver(obj: Path, output: Path) -> Path:
+    """Link cache object *obj* to *output*, recording its content hash."""
+    result = link_or_copy(obj, output if output.suffix else output.with_suffix(obj.suffix))
+    # cache objects are named after their SHA-256
+    write_hash_sidecar(result, obj.stem)
+    return result
+
+
+async def download(
+    url: str,
+    output: Path,
+    fmt: Optional[str] = None,
+    concurrent_fragments: int = INGEST_CONCURRENT_FRAGMENTS,
+    cache: Optional[DownloadCache] = None,
+) -> Path:
     """Download *url* into *output* and return the resulting path.
 
-    ``fmt`` can be used to force a specific yt-dlp format selection. The
-    function should raise an exception if the download fails or the file does not
-    comply with validation rules.
+    ``fmt`` can be used to force a specific yt-dlp format selection. When
+    *output* has no suffix, the extension of the downloaded media is used.
+    A ``RuntimeError`` is raised if yt-dlp fails or produces an empty file.
     """
-    # TODO: implement download via yt-dlp with validations
-    raise NotImplementedError
+    if cache is None:
+        cache = _get_cache()
+    key = cache.key(url, fmt)
+    lock = _key_locks.setdefault(key, asyncio.Lock())
+    _key_users[key] = _key_users.get(key, 0) + 1
+    try:
+        async with lock:
+            return await _download_locked(url, output, fmt, concurrent_fragments, cache, key)
+    finally:
+        _key_users[key] -= 1
+        if not _key_users[key]:
+            del _key_users[key]
+            del _key_locks[key]
+
+
+async def _download_locked(
+    url: str,
+    output: Path,
+    fmt: Optional[str],
+    concurrent_fragments: int,
+    cache: DownloadCache,
+    key: str,
+) -> Path:
+    cached = cache.lookup(key)
+    if cached is not None:
+        logging.info("⚡ Cache hit para %s", url)
+        return await asyncio.to_thread(_deliver, cached, output)
+
+    workdir = cache.partial_dir(key)
+    cmd = [
+        YTDLP_PATH,
+        url,
+        "-f", fmt or "bv*+ba/b",
+        "--concurrent-fragments", str(concurrent_fragments),
+        "--continue",
+        "--no-playlist",
+        "-P", str(workdir),
+        "-o", "media.%(ext)s",
+        "--no-simulate",
+        "--print", "after_move:filepath",
+    ]
+    logging.debug("Ejecutando subproceso: %s", " ".join(cmd))
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # yt-dlp would keep downloading with nobody waiting for it; the
+        # fragments already in the partial directory are resumed on retry
+        with contextlib.suppress(ProcessLookupError):
+            proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        logging.debug("stderr: %s", (stderr or b"").decode(errors="ignore"))
+        raise RuntimeError(f"Descarga fallida para {url}: code={proc.returncode}")
+
+    result = _find_result(stdout or b"", workdir)
+    if result is None or result.stat().st_size == 0:
+        raise RuntimeError(f"Descarga vacía o no encontrada para {url}")
+
+    # hashing and delivery (a full copy across filesystems) leave the loop;
+    # the cache index is updated here
+    digest = await asyncio.to_thread(hash_file, result)
+    stored = cache.store(key, result, digest)
+    logging.info("📥 Descargado %s -> %s", url, stored.name)
+    return await asyncio.to_thread(_deliver, stored, output)
@@ -11,9 +11,11 @@ import logging
 
 from telethon import TelegramClient
 
-from config import TELEGRAM_API_ID, TELEGRAM_API_HASH, BOT_TOKEN, LOG_LEVEL
+from config import TELEGRAM_API_ID, TELEGRAM_API_HASH, BOT_TOKEN, LOG_LEVEL, RECORDER_SHARDS
 from logging_config import configure_logging
 from commands import register_handlers
+from progress import ProgressReporter
+from shards import ShardedRecorder
 from task_queue import TaskQueue
 
 async def _run_workers(queue: TaskQueue) -> None:
@@ -36,9 +38,13 @@ async def main() -> None:
     level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
     configure_logging(level)
     queue = TaskQueue()
+    recorder = ShardedRecorder(RECORDER_SHARDS)
+    await recorder.start()
     client = TelegramClient("bot", TELEGRAM_API_ID, TELEGRAM_API_HASH)
     await client.start(bot_token=BOT_TOKEN)
-    register_handlers(client, queue)
+    progress = ProgressReporter(client)
+    await progress.start()
+    register_handlers(client, queue, recorder, progress)
     worker = asyncio.create_task(_run_workers(queue))
     try:
         await client.run_until_disconnected()
@@ -46,6 +52,8 @@ async def main() -> None:
         worker.cancel()
         with contextlib.suppress(Exception):
             await worker
+        await progress.close()
+        await recorder.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,353 @@
+"""Coalesced, rate-limited progress messages for Telegram.
+
+Long-running tasks (recordings, clips, transcodes, uploads) push progress text
+to a :class:`ProgressReporter` instead of editing messages themselves. The
+reporter keeps only the latest text per ``(chat, message)``, edits each message
+at most once every ``min_interval`` seconds and spends edits from a global token
+bucket shared by all chats. Completion notices queued within ``batch_window``
+seconds are sent to a chat as one message.
+
+``update`` and ``notify`` never block: the edits run in a background task.
+When Telegram answers with a flood wait, only the affected chat is paused and
+the global edit rate is halved, then recovers gradually with every successful
+edit, so other chats keep getting (slower) updates. Requests are sent with
+``flood_sleep_threshold=0``: otherwise Telethon would sleep through any wait
+up to the client's threshold inside the call, stalling every edit in flight.
+Texts are sent as plain text, without markdown parsing.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError, MessageIdInvalidError, MessageNotModifiedError
+from telethon.tl.functions.messages import EditMessageRequest, SendMessageRequest
+
+from config import PROGRESS_BATCH_WINDOW, PROGRESS_EDIT_INTERVAL, PROGRESS_EDITS_PER_SECOND
+
+__all__ = ["ProgressHandle", "ProgressReporter", "report_elapsed", "report_recording", "upload_progress"]
+
+T = TypeVar("T")
+
+# Fraction of the maximum rate regained after every successful request.
+_RECOVERY_STEP = 0.1
+# The edit rate never drops below this fraction of the configured maximum.
+_MIN_RATE_FRACTION = 0.05
+
+
+@dataclass
+class _Slot:
+    """Latest pending text for one progress message."""
+    text: str
+    since: float
+    dirty: bool = True
+    final: bool = False
+    in_flight: bool = False
+    last_edit: float = float("-inf")
+
+
+@dataclass
+class _Notices:
+    """Completion lines waiting to be sent to one chat."""
+    due: float
+    lines: List[str] = field(default_factory=list)
+    in_flight: bool = False
+
+
+class ProgressHandle:
+    """Progress message of a single task, bound to a :class:`ProgressReporter`."""
+
+    def __init__(self, reporter: "ProgressReporter", chat_id: int, message_id: int) -> None:
+        self.reporter = reporter
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    def update(self, text: str) -> None:
+        """Replace the text shown in the progress message."""
+        self.reporter.update(self.chat_id, self.message_id, text)
+
+    def done(self, text: str, notice: Optional[str] = None) -> None:
+        """Show the final *text* and optionally queue a batched *notice*."""
+        self.reporter.finish(self.chat_id, self.message_id, text)
+        if notice:
+            self.reporter.notify(self.chat_id, notice)
+
+
+class ProgressReporter:
+    """Background service that applies progress updates to Telegram messages."""
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        min_interval: float = PROGRESS_EDIT_INTERVAL,
+        edits_per_second: float = PROGRESS_EDITS_PER_SECOND,
+        batch_window: float = PROGRESS_BATCH_WINDOW,
+    ) -> None:
+        self._client = client
+        self.min_interval = min_interval
+        self.batch_window = batch_window
+        self.max_rate = edits_per_second
+        self.rate = edits_per_second
+        self._tokens = 1.0
+        self._refilled = time.monotonic()
+        self._slots: Dict[Tuple[int, int], _Slot] = {}
+        self._notices: Dict[int, _Notices] = {}
+        self._blocked: Dict[int, float] = {}  # chat_id -> monotonic deadline
+        self._requests: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    # -- public API -------------------------------------------------------
+
+    async def start(self) -> None:
+        """Start the background dispatcher."""
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 10) -> None:
+        """Flush pending work for up to *timeout* seconds and stop."""
+        deadline = time.monotonic() + timeout
+        while self._pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        tasks = list(self._requests)
+        if self._runner is not None:
+            tasks.append(self._runner)
+            self._runner = None
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+
+    def track(self, message) -> ProgressHandle:
+        """Return a handle that edits *message* (a Telethon ``Message``)."""
+        return ProgressHandle(self, message.chat_id, message.id)
+
+    def update(self, chat_id: int, message_id: int, text: str) -> None:
+        """Queue *text* for the message; earlier unsent text is discarded."""
+        self._set(chat_id, message_id, text, final=False)
+
+    def finish(self, chat_id: int, message_id: int, text: str) -> None:
+        """Queue the final *text*; the message is forgotten once it is sent."""
+        self._set(chat_id, message_id, text, final=True)
+
+    def notify(self, chat_id: int, text: str) -> None:
+        """Queue a completion notice, batched with others for the same chat."""
+        notices = self._notices.get(chat_id)
+        if notices is None:
+            notices = self._notices[chat_id] = _Notices(due=time.monotonic() + self.batch_window)
+        notices.lines.append(text)
+        self._wake.set()
+
+    # -- internals --------------------------------------------------------
+
+    def _set(self, chat_id: int, message_id: int, text: str, final: bool) -> None:
+        key = (chat_id, message_id)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot(text=text, since=time.monotonic())
+        elif slot.final:
+            return  # the task already reported its final state
+        else:
+            if not slot.dirty:
+                slot.since = time.monotonic()
+            slot.text = text
+            slot.dirty = True
+        slot.final = final
+        self._wake.set()
+
+    def _pending(self) -> bool:
+        return any(s.dirty or s.in_flight for s in self._slots.values()) or bool(self._notices)
+
+    def _refill(self, now: float) -> None:
+        capacity = max(1.0, self.rate)
+        self._tokens = min(capacity, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            delay = self._dispatch(time.monotonic())
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+
+    def _dispatch(self, now: float) -> Optional[float]:
+        """Start every request the budget allows; return seconds until the next one."""
+        self._refill(now)
+        ready = []  # (waiting since, kind, key)
+        next_at: Optional[float] = None
+
+        def later(at: float) -> None:
+            nonlocal next_at
+            next_at = at if next_at is None else min(next_at, at)
+
+        for key, slot in list(self._slots.items()):
+            if slot.in_flight:
+                continue
+            if not slot.dirty:
+                # keep the slot only while it still limits the next edit
+                if now - slot.last_edit >= self.min_interval:
+                    del self._slots[key]
+                continue
+            at = max(slot.last_edit + self.min_interval, self._blocked.get(key[0], 0.0))
+            if at <= now:
+                ready.append((slot.since, "edit", key))
+            else:
+                later(at)
+        for chat_id, notices in self._notices.items():
+            if notices.in_flight:
+                continue
+            at = max(notices.due, self._blocked.get(chat_id, 0.0))
+            if at <= now:
+                ready.append((notices.due, "notice", chat_id))
+            else:
+                later(at)
+
+        ready.sort(key=lambda item: item[0])
+        for _, kind, key in ready:
+            if self._tokens < 1:
+                later(now + (1 - self._tokens) / self.rate)
+                break
+            self._tokens -= 1
+            coro = self._edit(key) if kind == "edit" else self._send_notices(key)
+            task = asyncio.create_task(coro)
+            self._requests.add(task)
+            task.add_done_callback(self._requests.discard)
+
+        return None if next_at is None else max(0.0, next_at - now)
+
+    def _on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.max_rate * _RECOVERY_STEP)
+
+    def _on_flood(self, chat_id: int, seconds: int) -> None:
+        self._blocked[chat_id] = time.monotonic() + seconds
+        self.rate = max(self.max_rate * _MIN_RATE_FRACTION, self.rate / 2)
+        logging.warning("FloodWait de %ss en chat %s; tasa de edición %.2f/s", seconds, chat_id, self.rate)
+
+    async def _edit(self, key: Tuple[int, int]) -> None:
+        slot = self._slots[key]
+        slot.in_flight = True
+        slot.dirty = False
+        text = slot.text
+        try:
+            await self._client(EditMessageRequest(peer=key[0], id=key[1], message=text), flood_sleep_threshold=0)
+            self._on_success()
+        except FloodWaitError as ex:
+            self._on_flood(key[0], ex.seconds)
+            slot.dirty = True  # retry with whatever text is current by then
+        except (MessageNotModifiedError, MessageIdInvalidError):
+            pass
+        except Exception as ex:
+            logging.warning("No se pudo editar progreso en %s: %s", key[0], ex)
+        finally:
+            slot.in_flight = False
+            slot.last_edit = time.monotonic()
+            if slot.final and not slot.dirty:
+                self._slots.pop(key, None)
+            self._wake.set()
+
+    async def _send_notices(self, chat_id: int) -> None:
+        notices = self._notices[chat_id]
+        notices.in_flight = True
+        lines, notices.lines = notices.lines, []
+        try:
+            await self._client(SendMessageRequest(peer=chat_id, message="\n".join(lines)), flood_sleep_threshold=0)
+            self._on_success()
+        except FloodWaitError as ex:
+            self._on_flood(chat_id, ex.seconds)
+            notices.lines[:0] = lines
+        except Exception as ex:
+            logging.warning("No se pudo enviar aviso a %s: %s", chat_id, ex)
+        finally:
+            notices.in_flight = False
+            if not notices.lines:
+                self._notices.pop(chat_id, None)
+            self._wake.set()
+
+
+async def report_elapsed(
+    handle: ProgressHandle,
+    label: str,
+    aw: Awaitable[T],
+    total: Optional[int] = None,
+    interval: float = 1.0,
+) -> T:
+    """Await *aw* while pushing ``label (elapsed/total)`` updates to *handle*.
+
+    The reporter coalesces the ticks, so *interval* only bounds staleness.
+    """
+    task = asyncio.ensure_future(aw)
+    started = time.monotonic()
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=interval)
+            if done:
+                return task.result()
+            elapsed = int(time.monotonic() - started)
+            suffix = f"{elapsed}s/{total}s" if total else f"{elapsed}s"
+            handle.update(f"{label} ({suffix})")
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+def _format_size(num_bytes: float) -> str:
+    if num_bytes < 1024:
+        return f"{num_bytes:.0f} B"
+    for unit in ("KB", "MB"):
+        num_bytes /= 1024
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+    return f"{num_bytes / 1024:.1f} GB"
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+def upload_progress(handle: ProgressHandle, label: str) -> Callable[[int, int], None]:
+    """Return a Telethon ``progress_callback`` that reports upload progress to *handle*."""
+    def callback(sent: int, total: int) -> None:
+        percent = sent * 100 // total if total else 100
+        handle.update(f"{label} {percent}% ({_format_size(sent)}/{_format_size(total)})")
+
+    return callback
+
+
+async def report_recording(
+    handle: ProgressHandle,
+    label: str,
+    status: Callable[[], Awaitable[Optional[Tuple[int, float]]]],
+    interval: float = 10.0,
+) -> None:
+    """Show the size and duration of a recording until *status* returns ``None``.
+
+    *status* returns ``(bytes written, seconds elapsed)`` while the recording
+    runs; the last values are kept in the final text.
+    """
+    def describe(values: Tuple[int, float]) -> str:
+        return f"{_format_size(values[0])}, {_format_duration(values[1])}"
+
+    last: Optional[Tuple[int, float]] = None
+    try:
+        while True:
+            current = await status()
+            if current is None:
+                break
+            last = current
+            handle.update(f"{label} ({describe(last)})")
+            await asyncio.sleep(interval)
+    except asyncio.CancelledError:
+        handle.done(f"{label}: sin seguimiento")
+        raise
+    except Exception as ex:
+        handle.done(f"⚠️ {label}: estado no disponible ({ex})")
+        return
+    handle.done(f"{label}: finalizada ({describe(last)})" if last else f"{label}: finalizada")
@@ -0,0 +1,270 @@
+"""Load-aware selection of the stream variant each recording uses.
+
+Instead of always asking yt-dlp for ``best``, the recorder lets a
+:class:`QualityPolicy` pick a variant per recording from the formats the stream
+offers, the current network and disk write rates and an optional per-model
+priority (higher is more important):
+
+* a new recording gets the best variant that fits under the high watermark,
+  counting the headroom that lower-priority recordings could give up;
+* while load is above the high watermark, recordings are stepped down one
+  variant at a time, lowest priority first;
+* once load falls below the low watermark they are stepped back up, highest
+  priority first, as long as the projected load stays under the high
+  watermark. The gap between both watermarks prevents flapping.
+
+The recorder applies changes at segment boundaries. Every change is logged
+and kept in :attr:`QualityPolicy.decisions`.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import (
+    QUALITY_DISK_CAPACITY_MB,
+    QUALITY_HIGH_WATERMARK,
+    QUALITY_LOW_WATERMARK,
+    QUALITY_NET_CAPACITY_MBIT,
+)
+
+__all__ = [
+    "Decision",
+    "LoadMonitor",
+    "LoadSample",
+    "QualityPolicy",
+    "StreamState",
+    "Variant",
+    "parse_variants",
+]
+
+
+@dataclass(frozen=True)
+class Variant:
+    """One selectable format of a stream."""
+    format_id: str
+    bitrate: float  # bits per second
+    height: Optional[int] = None
+
+    @property
+    def byte_rate(self) -> float:
+        return self.bitrate / 8
+
+
+@dataclass(frozen=True)
+class LoadSample:
+    """Aggregate host load in bytes per second."""
+    net_bps: float = 0.0
+    disk_bps: float = 0.0
+
+    def shifted(self, delta: float) -> "LoadSample":
+        """Return the load after a recording changes its rate by *delta* bytes/s.
+
+        A recording's bytes are both received and written, so both grow.
+        """
+        return LoadSample(max(0.0, self.net_bps + delta), max(0.0, self.disk_bps + delta))
+
+
+@dataclass(frozen=True)
+class StreamState:
+    """What the policy needs to know about one active recording."""
+    model: str
+    variants: Tuple[Variant, ...]  # ascending bitrate
+    current: Variant
+    priority: int = 0
+
+    def step(self, variant: Variant, direction: int) -> Optional[Variant]:
+        """Return the neighbouring variant in *direction* (-1 down, +1 up)."""
+        idx = self.variants.index(variant) + direction
+        return self.variants[idx] if 0 <= idx < len(self.variants) else None
+
+
+@dataclass(frozen=True)
+class Decision:
+    """A variant change made by the policy."""
+    time: float
+    model: str
+    old: Optional[str]
+    new: str
+    utilization: float
+    reason: str
+
+
+def parse_variants(info: Dict[str, Any]) -> List[Variant]:
+    """Extract muxed audio+video variants with a known bitrate from ``yt-dlp -J`` output.
+
+    Video-only formats are skipped: recording one of them would drop the audio.
+    """
+    variants = {}
+    for fmt in info.get("formats") or []:
+        tbr = fmt.get("tbr")
+        if not tbr or "none" in (fmt.get("vcodec"), fmt.get("acodec")) or not fmt.get("format_id"):
+            continue
+        variant = Variant(str(fmt["format_id"]), float(tbr) * 1000, fmt.get("height"))
+        variants[variant.format_id] = variant
+    return sorted(variants.values(), key=lambda v: v.bitrate)
+
+
+def _system_counters() -> Tuple[int, int]:
+    """Return bytes received on non-loopback interfaces and bytes written to disks."""
+    received = 0
+    try:
+        with open("/proc/net/dev") as fh:
+            for line in list(fh)[2:]:
+                name, data = line.split(":", 1)
+                if name.strip() != "lo":
+                    received += int(data.split()[0])
+    except (OSError, ValueError):
+        pass
+    written = 0
+    try:
+        disks = {d for d in os.listdir("/sys/block") if not d.startswith(("loop", "ram", "zram"))}
+        with open("/proc/diskstats") as fh:
+            for line in fh:
+                fields = line.split()
+                if len(fields) > 9 and fields[2] in disks:
+                    written += int(fields[9]) * 512  # sectors written
+    except (OSError, ValueError):
+        pass
+    return received, written
+
+
+class LoadMonitor:
+    """Turn cumulative byte counters into rates between successive samples.
+
+    The default counters are host-wide, so with several recorder shards the
+    load is sampled once, in the parent process.
+    """
+
+    def __init__(self, counters: Callable[[], Tuple[int, int]] = _system_counters) -> None:
+        self._counters = counters
+        self._last: Optional[Tuple[float, int, int]] = None
+
+    def sample(self) -> LoadSample:
+        """Return the rates since the previous sample and start a new interval."""
+        current = (time.monotonic(), *self._counters())
+        last, self._last = self._last, current
+        return self._rates(last, current)
+
+    def peek(self) -> LoadSample:
+        """Return the rates since the previous sample without starting a new interval."""
+        return self._rates(self._last, (time.monotonic(), *self._counters()))
+
+    @staticmethod
+    def _rates(last: Optional[Tuple[float, int, int]], current: Tuple[float, int, int]) -> LoadSample:
+        if last is None or current[0] <= last[0]:
+            return LoadSample()
+        elapsed = current[0] - last[0]
+        return LoadSample(max(0, current[1] - last[1]) / elapsed, max(0, current[2] - last[2]) / elapsed)
+
+
+class QualityPolicy:
+    """Pick and adjust recording variants from host load and priorities."""
+
+    def __init__(
+        self,
+        net_capacity_bps: float = QUALITY_NET_CAPACITY_MBIT * 1_000_000 / 8,
+        disk_capacity_bps: float = QUALITY_DISK_CAPACITY_MB * 1_000_000,
+        high_watermark: float = QUALITY_HIGH_WATERMARK,
+        low_watermark: float = QUALITY_LOW_WATERMARK,
+        history: int = 200,
+    ) -> None:
+        if not 0 < low_watermark < high_watermark:
+            raise ValueError("se requiere 0 < low_watermark < high_watermark")
+        self.net_capacity_bps = net_capacity_bps
+        self.disk_capacity_bps = disk_capacity_bps
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.decisions: Deque[Decision] = deque(maxlen=history)
+
+    def utilization(self, load: LoadSample) -> float:
+        """Fraction of the scarcest resource in use; capacities <= 0 are unlimited."""
+        ratios = [0.0]
+        if self.net_capacity_bps > 0:
+            ratios.append(load.net_bps / self.net_capacity_bps)
+        if self.disk_capacity_bps > 0:
+            ratios.append(load.disk_bps / self.disk_capacity_bps)
+        return max(ratios)
+
+    def _record(self, model: str, old: Optional[Variant], new: Variant, load: LoadSample, reason: str) -> None:
+        decision = Decision(
+            time.time(), model, old.format_id if old else None, new.format_id, self.utilization(load), reason
+        )
+        self.decisions.append(decision)
+        logging.info(
+            "🎚️ Calidad %s: %s -> %s (%s, uso %.0f%%)",
+            model, decision.old or "-", decision.new, reason, decision.utilization * 100,
+        )
+
+    def select(
+        self,
+        model: str,
+        variants: Sequence[Variant],
+        load: LoadSample,
+        priority: int = 0,
+        others: Iterable[StreamState] = (),
+    ) -> Variant:
+        """Choose the variant for a recording that is about to start."""
+        ordered = sorted(variants, key=lambda v: v.bitrate)
+        # headroom that lower-priority recordings could hand over by downgrading
+        reclaimable = sum(
+            s.current.byte_rate - s.variants[0].byte_rate for s in others if s.priority < priority
+        )
+        base = load.shifted(-reclaimable)
+        choice = ordered[0]
+        for variant in reversed(ordered):
+            if self.utilization(base.shifted(variant.byte_rate)) <= self.high_watermark:
+                choice = variant
+                break
+        self._record(model, None, choice, load, "inicio")
+        return choice
+
+    def rebalance(self, states: Sequence[StreamState], load: LoadSample) -> Dict[str, Variant]:
+        """Return the recordings whose variant should change, and to what."""
+        current = {s.model: s.current for s in states}
+        changes: Dict[str, Variant] = {}
+        projected = load
+
+        if self.utilization(load) > self.high_watermark:
+            while self.utilization(projected) > self.high_watermark:
+                # lowest priority first; among equals the most expensive one
+                candidates = [s for s in states if s.step(current[s.model], -1) is not None]
+                if not candidates:
+                    break
+                state = min(candidates, key=lambda s: (s.priority, -current[s.model].bitrate))
+                old = current[state.model]
+                new = state.step(old, -1)
+                projected = projected.shifted(new.byte_rate - old.byte_rate)
+                current[state.model] = changes[state.model] = new
+            reason = "bajada por carga"
+        elif self.utilization(load) < self.low_watermark:
+            stepped = set()
+            while True:
+                # highest priority first; among equals the cheapest one
+                candidates = [
+                    s for s in states
+                    if s.model not in stepped and s.step(current[s.model], +1) is not None
+                ]
+                if not candidates:
+                    break
+                state = min(candidates, key=lambda s: (-s.priority, current[s.model].bitrate))
+                stepped.add(state.model)  # one step per round keeps upgrades gradual
+                old = current[state.model]
+                new = state.step(old, +1)
+                after = projected.shifted(new.byte_rate - old.byte_rate)
+                if self.utilization(after) > self.high_watermark:
+                    continue
+                projected = after
+                current[state.model] = changes[state.model] = new
+            reason = "subida con margen"
+        else:
+            return {}
+
+        by_model = {s.model: s for s in states}
+        for model, new in changes.items():
+            self._record(model, by_model[model].current, new, load, reason)
+        return changes
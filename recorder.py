@@ -1,14 +1,25 @@
 # recorder.py
 import asyncio
+import contextlib
+import hashlib
+import json
 import logging
+import os
 import shlex
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 import signal
+import threading
+import time
 
-from config import OUTPUT_DIR, CLIP_DURATION, MONITOR_POLL_INTERVAL, YTDLP_PATH, FFMPEG_PATH, LOG_LEVEL
+from config import (
+    OUTPUT_DIR, CLIP_DURATION, MONITOR_POLL_INTERVAL, YTDLP_PATH, FFMPEG_PATH, LOG_LEVEL,
+    MODEL_PRIORITIES, QUALITY_CHECK_INTERVAL,
+)
+from fs_utils import write_hash_sidecar
+from quality import LoadMonitor, LoadSample, QualityPolicy, StreamState, Variant, parse_variants
 
 LOG_LEVEL_MAP = {
     "DEBUG": logging.DEBUG,
@@ -24,6 +35,23 @@ logging.basicConfig(
 
 Path(OUTPUT_DIR).mkdir(exist_ok=True)
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# ffmpeg remultiplexa el MPEG-TS de yt-dlp a MP4 fragmentado sin recodificar.
+# Cada fragmento (un GOP) se escribe completo, así que el archivo es reproducible
+# aunque el grabador muera y no hace falta un remux al terminar.
+FMP4_MUX_ARGS = [
+    "-hide_banner", "-loglevel", "error",
+    "-i", "pipe:0",
+    "-map", "0:v?", "-map", "0:a?",
+    "-c", "copy",
+    "-f", "mp4",
+    "-movflags", "+frag_keyframe+empty_moov+default_base_moof",
+    "-flush_packets", "1",
+    "pipe:1",
+]
+MUXER_EXIT_TIMEOUT = 10
+
 
 def _timestamp() -> str:
     return datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -37,14 +65,41 @@ class Recording:
         self.proc = proc
         self.task = task
         self.out_path = out_path
+        self.muxer: Optional[asyncio.subprocess.Process] = None
+        self.bytes_written = 0
+        self.variants: List[Variant] = []
+        self.variant: Optional[Variant] = None
+        self.switch_to: Optional[Variant] = None  # variante del siguiente segmento
+        self.stop_requested = False
+        self.parts: List[Path] = [out_path]  # segmentos de la sesión, incluido el actual
+        self.started = time.monotonic()  # inicio de la sesión, no del segmento
+        self.bytes_before = 0  # bytes de los segmentos anteriores
 
 
 class RecorderManager:
-    """Gestiona grabaciones y monitores."""
-    def __init__(self):
+    """
+    Gestiona grabaciones y monitores.
+    Con quality_loop=False no reequilibra la calidad por su cuenta: lo hace quien
+    vea todas las grabaciones del host (ShardedRecorder) mediante switch_variant.
+    """
+    def __init__(self, quality_loop: bool = True):
         self.recordings: Dict[str, Recording] = {}  # key: model_name
         self.monitor_tasks: Dict[str, asyncio.Task] = {}  # key: model_name
+        self._background: Set[asyncio.Task] = set()
+        self._starting: Set[str] = set()  # modelos reservados mientras se sondean sus variantes
+        self._stop_pending: Set[str] = set()  # /stop recibido durante el sondeo
         self._running = True
+        self.priorities: Dict[str, int] = dict(MODEL_PRIORITIES)
+        self.quality = QualityPolicy()
+        self.load = LoadMonitor()
+        self._quality_task: Optional[asyncio.Task] = None
+        self._quality_loop_enabled = quality_loop
+        # con quality_loop=False la carga la mide el padre y la envía con set_load_hint
+        self._load_hint: Optional[LoadSample] = None
+        self._others_hint: List[StreamState] = []
+        self._picked_since_hint: List[Variant] = []
+        if quality_loop:
+            self.load.sample()  # primer punto de referencia para las tasas
 
     async def _run_subprocess(self, *cmd) -> asyncio.subprocess.Process:
         """Lanza un subprocess sin esperar, devolviendo el handle."""
@@ -56,110 +111,410 @@ class RecorderManager:
         )
         return proc
 
-    async def record_stream(self, url: str, model_name: str) -> Path:
+    async def _run_muxed(self, *cmd) -> Tuple[asyncio.subprocess.Process, asyncio.subprocess.Process]:
+        """
+        Lanza yt-dlp (*cmd* con '-o -') conectado por un pipe del SO a ffmpeg,
+        que entrega MP4 fragmentado por su stdout. Devuelve (yt-dlp, ffmpeg).
+        """
+        logging.debug("Ejecutando subproceso: %s | %s %s", " ".join(cmd), FFMPEG_PATH, " ".join(FMP4_MUX_ARGS))
+        read_fd, write_fd = os.pipe()
+        try:
+            source = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=write_fd,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                muxer = await asyncio.create_subprocess_exec(
+                    FFMPEG_PATH, *FMP4_MUX_ARGS,
+                    stdin=read_fd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except Exception:
+                with contextlib.suppress(ProcessLookupError):
+                    source.kill()
+                await source.wait()
+                raise
+        finally:
+            # los hijos tienen sus copias; cerrar las nuestras para que llegue el EOF
+            os.close(read_fd)
+            os.close(write_fd)
+        return source, muxer
+
+    async def _write_stream(self, stream: asyncio.StreamReader, out_file: Path, rec: Optional[Recording] = None) -> Optional[str]:
+        """
+        Vuelca *stream* a *out_file* calculando el SHA-256 al vuelo.
+        El archivo se crea con el primer bloque; al terminar se guarda el hash
+        junto al archivo para que la subida no tenga que releerlo.
+        Devuelve el hash o None si el stream no produjo datos.
+        La apertura, la escritura y el hash de cada bloque van a un hilo para no
+        bloquear el loop, que atiende todas las grabaciones del proceso.
+        """
+        digest = hashlib.sha256()
+        fh = None
+        closed = False
+        # Cancelar la tarea no detiene el hilo de un bloque en curso: el cierre
+        # espera a que termine y los bloques que lleguen después se descartan.
+        lock = threading.Lock()
+
+        def append(chunk: bytes) -> None:
+            nonlocal fh
+            with lock:
+                if closed:
+                    return
+                if fh is None:
+                    fh = open(out_file, "wb")
+                fh.write(chunk)
+                digest.update(chunk)
+
+        try:
+            while True:
+                chunk = await stream.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await asyncio.to_thread(append, chunk)
+                if rec is not None:
+                    rec.bytes_written += len(chunk)
+        finally:
+            # síncrono a propósito: debe completarse aunque la tarea se cancele
+            with lock:
+                closed = True
+                if fh is not None:
+                    fh.close()
+                    write_hash_sidecar(out_file, digest.hexdigest())
+        return digest.hexdigest() if fh is not None else None
+
+    async def _probe_variants(self, url: str) -> List[Variant]:
+        """Lista las variantes del stream con 'yt-dlp -J'. Devuelve [] si no se pueden obtener."""
+        try:
+            proc = await self._run_subprocess(YTDLP_PATH, "-J", url)
+        except FileNotFoundError:
+            return []
+        try:
+            stdout = await asyncio.wait_for(proc.stdout.read(), timeout=20)
+            await asyncio.wait_for(proc.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            proc.kill()
+            return []
+        if proc.returncode != 0:
+            return []
+        try:
+            return parse_variants(json.loads(stdout))
+        except (ValueError, AttributeError):
+            return []
+
+    def set_priority(self, model_name: str, priority: int) -> None:
+        """Define la prioridad de calidad de un modelo (mayor = se degrada después)."""
+        self.priorities[model_name] = priority
+
+    def stream_states(self) -> List[StreamState]:
+        """Estado de las grabaciones cuya variante puede cambiar ahora."""
+        return [
+            StreamState(m, tuple(r.variants), r.variant, self.priorities.get(m, 0))
+            for m, r in self.recordings.items()
+            if r.variant is not None and r.switch_to is None
+        ]
+
+    def set_load_hint(self, load: LoadSample, others: List[StreamState]) -> None:
+        """Guarda la carga del host y las grabaciones de todos los shards, medidas por el padre."""
+        self._load_hint = load
+        self._others_hint = list(others)
+        self._picked_since_hint = []
+
+    def _selection_context(
+        self, load: Optional[LoadSample], others: Optional[List[StreamState]]
+    ) -> Tuple[LoadSample, List[StreamState]]:
+        """Carga y grabaciones a considerar al elegir la variante de una grabación nueva."""
+        if load is None:
+            if self._quality_loop_enabled:
+                load = self.load.peek()
+            else:
+                # el último dato del padre aún no incluye lo que se ha empezado desde entonces
+                load = (self._load_hint or LoadSample()).shifted(
+                    sum(v.byte_rate for v in self._picked_since_hint)
+                )
+        local = self.stream_states()
+        known = {s.model for s in local}
+        remote = others if others is not None else self._others_hint
+        return load, [s for s in remote if s.model not in known] + local
+
+    def switch_variant(self, model_name: str, format_id: str) -> bool:
+        """Corta el segmento actual para seguir con *format_id*. Devuelve False si no aplica."""
+        rec = self.recordings.get(model_name)
+        if rec is None or rec.switch_to is not None or rec.proc.returncode is not None:
+            return False
+        variant = next((v for v in rec.variants if v.format_id == format_id), None)
+        if variant is None:
+            return False
+        # cortar el segmento actual; record_stream sigue con la nueva variante
+        rec.switch_to = variant
+        with contextlib.suppress(ProcessLookupError):
+            rec.proc.send_signal(signal.SIGINT)
+        return True
+
+    def _ensure_quality_loop(self) -> None:
+        if not self._quality_loop_enabled:
+            return
+        if self._quality_task is None or self._quality_task.done():
+            self.load.sample()  # primer punto de referencia para las tasas
+            self._quality_task = asyncio.create_task(self._quality_loop())
+
+    async def _quality_loop(self):
+        """Reevalúa la calidad de las grabaciones activas mientras existan."""
+        while self.recordings:
+            await asyncio.sleep(QUALITY_CHECK_INTERVAL)
+            changes = self.quality.rebalance(self.stream_states(), self.load.sample())
+            for model_name, variant in changes.items():
+                self.switch_variant(model_name, variant.format_id)
+
+    async def record_stream(
+        self, url: str, model_name: str,
+        load: Optional[LoadSample] = None, others: Optional[List[StreamState]] = None,
+    ) -> Optional[Path]:
         """
-        Inicia grabación con yt-dlp y devuelve Path de salida.
+        Inicia grabación con yt-dlp y devuelve Path de salida, o None si se
+        pidió detenerla antes de lanzar yt-dlp.
+        *load* y *others* (carga del host y grabaciones de otros shards) guían
+        la elección inicial de variante; sin ellos se usa lo medido localmente.
         Esta coroutine finaliza cuando la grabación termina o cuando se cancela.
+        Si la política de calidad cambia la variante, la grabación continúa en
+        un nuevo segmento (_partN) y se devuelve el Path del último; la lista
+        completa queda en Recording.parts y en list_recordings.
         """
-        ts = _timestamp()
-        out_file = Path(OUTPUT_DIR) / f"{model_name}_{ts}.mp4"
+        try:
+            ts = _timestamp()
+            variants = await self._probe_variants(url)
+            if model_name in self._stop_pending:
+                logging.info("⛔ Grabación de %s detenida antes de empezar", model_name)
+                return None
+            variant = None
+            if variants:
+                load, others = self._selection_context(load, others)
+                variant = self.quality.select(
+                    model_name, variants, load, self.priorities.get(model_name, 0), others
+                )
+                if not self._quality_loop_enabled:
+                    self._picked_since_hint.append(variant)
+            parts: List[Path] = []
+            while True:
+                suffix = f"_part{len(parts)}" if parts else ""
+                out_file = Path(OUTPUT_DIR) / f"{model_name}_{ts}{suffix}.mp4"
+                parts.append(out_file)
+                rec = await self._record_segment(url, model_name, out_file, variants, variant, parts)
+                if rec.switch_to is None or rec.stop_requested:
+                    if len(parts) > 1:
+                        logging.info(
+                            "📼 %s grabado en %s partes: %s", model_name, len(parts), ", ".join(p.name for p in parts)
+                        )
+                    return out_file
+                variant = rec.switch_to
+        finally:
+            self._starting.discard(model_name)
+            self._stop_pending.discard(model_name)
 
+    async def _record_segment(
+        self, url: str, model_name: str, out_file: Path, variants: List[Variant], variant: Optional[Variant],
+        parts: Optional[List[Path]] = None,
+    ) -> Recording:
+        """Graba un segmento con la variante dada hasta que termine, se cancele o se cambie de variante."""
+        # yt-dlp -> ffmpeg (MP4 fragmentado) -> disco, hasheando al vuelo
         cmd = [
             YTDLP_PATH,
             url,
-            "-f", "best",
-            "-o", str(out_file),
-            "--no-part",
+            "-f", variant.format_id if variant else "best",
+            "-o", "-",
             "--hls-use-mpegts",
             "--retries", "infinite",
             "--fragment-retries", "infinite",
         ]
 
-        proc = await self._run_subprocess(*cmd)
+        proc, muxer = await self._run_muxed(*cmd)
+        writer = None
+
+        async def finish_muxer():
+            # ffmpeg termina al recibir EOF tras cerrar el último fragmento
+            try:
+                _, mux_err = await asyncio.wait_for(
+                    asyncio.gather(muxer.wait(), muxer.stderr.read()), timeout=MUXER_EXIT_TIMEOUT
+                )
+                if muxer.returncode != 0 and not rec.stop_requested and rec.switch_to is None:
+                    logging.warning("⚠ ffmpeg finalizó con código %s para %s", muxer.returncode, model_name)
+                if mux_err:
+                    logging.debug("ffmpeg stderr: %s", mux_err.decode(errors="ignore"))
+            except asyncio.TimeoutError:
+                logging.warning("ffmpeg no terminó a tiempo para %s; forzando kill.", model_name)
+                with contextlib.suppress(ProcessLookupError):
+                    muxer.kill()
+                await muxer.wait()
+
+        async def stop_processes():
+            # enviar SIGINT y después SIGTERM si sigue vivo
+            try:
+                proc.send_signal(signal.SIGINT)
+                await asyncio.sleep(1)
+                if proc.returncode is None:
+                    proc.terminate()
+                    await asyncio.sleep(0.5)
+                    if proc.returncode is None:
+                        proc.kill()
+            except Exception as ex:
+                logging.debug("error al matar proceso: %s", ex)
+            # dejar que ffmpeg cierre el último fragmento y vaciar el pipe
+            with contextlib.suppress(Exception):
+                await finish_muxer()
+                await writer
+
         # Crear tarea que espere al proceso y registre resultado
         async def waiter():
             try:
+                if rec.stop_requested:
+                    # la detención llegó mientras se lanzaba este segmento
+                    logging.info("⛔ Cancelando grabación de %s", model_name)
+                    await stop_processes()
+                    return
                 logging.info("🟢 Grabando %s -> %s (pid=%s)", model_name, out_file, proc.pid)
-                stdout, stderr = await proc.communicate()
+                stderr = await proc.stderr.read()
+                await proc.wait()
+                await finish_muxer()
+                await writer
                 if proc.returncode == 0:
                     logging.info("✅ Grabación finalizada %s", out_file)
+                elif rec.switch_to is not None:
+                    logging.info("🎚️ Segmento cerrado por cambio de calidad %s", out_file)
                 else:
                     logging.warning("⚠ yt-dlp finalizó con código %s para %s", proc.returncode, model_name)
                     logging.debug("stderr: %s", (stderr or b"").decode(errors="ignore"))
             except asyncio.CancelledError:
                 logging.info("⛔ Cancelando grabación de %s", model_name)
-                # enviar SIGINT y después SIGTERM si sigue vivo
-                try:
-                    proc.send_signal(signal.SIGINT)
-                    await asyncio.sleep(1)
-                    if proc.returncode is None:
-                        proc.terminate()
-                        await asyncio.sleep(0.5)
-                        if proc.returncode is None:
-                            proc.kill()
-                except Exception as ex:
-                    logging.debug("error al matar proceso: %s", ex)
+                await stop_processes()
                 raise
 
         task = asyncio.create_task(waiter())
         rec = Recording(model_name, url, proc, task, out_file)
+        rec.muxer = muxer
+        rec.variants = variants
+        rec.variant = variant
+        if parts is not None:
+            rec.parts = parts
+        writer = asyncio.create_task(self._write_stream(muxer.stdout, out_file, rec))
+        previous = self.recordings.get(model_name)
+        if previous is not None:
+            # nuevo segmento de la misma sesión
+            rec.started = previous.started
+            rec.bytes_before = previous.bytes_before + previous.bytes_written
         self.recordings[model_name] = rec
+        if previous is not None and previous.stop_requested:
+            # se pidió detener durante el cambio de segmento; el waiter aún no
+            # ha arrancado, así que cancelarlo no llegaría a parar los procesos
+            rec.stop_requested = True
+        self._ensure_quality_loop()
+        switching = False
         try:
             await task  # se espera a que termine o se cancele externamente
+            switching = rec.switch_to is not None and not rec.stop_requested
         finally:
-            # limpiar registro si ya no existe
-            self.recordings.pop(model_name, None)
+            # limpiar registro salvo que continúe en un nuevo segmento
+            if not switching and self.recordings.get(model_name) is rec:
+                self.recordings.pop(model_name, None)
 
-        # Verificar que el proceso terminó correctamente y que el archivo existe
-        if proc.returncode != 0 or not out_file.exists():
+        if switching or rec.stop_requested:
+            # corte pedido por la política de calidad o por el usuario: el código de salida no indica fallo
+            return rec
+        # Verificar que yt-dlp y ffmpeg terminaron correctamente y que el archivo existe
+        if proc.returncode != 0 or muxer.returncode != 0 or not out_file.exists():
             raise RuntimeError(
-                f"Grabación fallida para {model_name}: code={proc.returncode}, file={out_file.exists()}"
+                f"Grabación fallida para {model_name}: code={proc.returncode}, "
+                f"ffmpeg={muxer.returncode}, file={out_file.exists()}"
             )
-        return out_file
+        return rec
+
+    def start_recording(
+        self, url: str, model_name: str,
+        load: Optional[LoadSample] = None, others: Optional[List[StreamState]] = None,
+    ) -> bool:
+        """Lanza record_stream en background. Devuelve False si ya estaba grabando."""
+        if model_name in self.recordings or model_name in self._starting:
+            return False
+        # reservar el nombre ya: el sondeo de variantes puede tardar hasta 20 s
+        self._starting.add(model_name)
+
+        async def _safe_record():
+            try:
+                await self.record_stream(url, model_name, load, others)
+            except Exception as ex:  # pragma: no cover - solo logging
+                logging.error("Error grabando %s: %s", model_name, ex)
+
+        task = asyncio.create_task(_safe_record())
+        # mantener referencia para que la tarea no sea recolectada
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return True
 
     async def stop_recording(self, model_name: str) -> bool:
         """Intenta detener una grabación en curso. Devuelve True si existía y fue solicitada a detener."""
-        rec = self.recordings.get(model_name)
-        if not rec:
-            return False
+        rec = self.recordings.get(model_name)
+        if not rec:
+            if model_name in self._starting:
+                # aún sondeando variantes: record_stream no lanzará yt-dlp
+                self._stop_pending.add(model_name)
+                return True
+            return False
         logging.info("Solicitando detención de grabación de %s (pid=%s)", model_name, rec.proc.pid if rec.proc else "N/A")
+        rec.stop_requested = True
         rec.task.cancel()
         # rec.proc es manejado dentro del waiter (muerte segura)
         try:
             await asyncio.wait_for(rec.task, timeout=15)
         except asyncio.TimeoutError:
             logging.warning("El proceso no finalizó a tiempo; forzando kill.")
-            try:
-                rec.proc.kill()
-            except Exception:
-                pass
+            # matar también ffmpeg: si no, el writer sigue esperando su stdout
+            for proc in (rec.proc, rec.muxer):
+                try:
+                    if proc is not None:
+                        proc.kill()
+                except Exception:
+                    pass
         except asyncio.CancelledError:
             # La tarea fue cancelada con éxito; el waiter se encarga de limpiar el proceso
             pass
         return True
 
+    async def stop_all(self) -> None:
+        """Detiene a la vez todas las grabaciones, incluidas las que aún se están iniciando."""
+        names = set(self.recordings) | self._starting
+        await asyncio.gather(*(self.stop_recording(m) for m in names), return_exceptions=True)
+
     async def record_clip(self, url: str, model_name: str, duration: int = CLIP_DURATION) -> Path:
-        """Corta un clip de la transmisión usando yt-dlp (downloader ffmpeg con -t)."""
+        """Corta un clip de la transmisión usando yt-dlp (downloader ffmpeg con -t), en MP4 fragmentado."""
         ts = _timestamp()
         out_file = Path(OUTPUT_DIR) / f"{model_name}_clip_{ts}.mp4"
 
         cmd = [
             YTDLP_PATH,
             "--hls-use-mpegts",
-            "--no-part",
             "--downloader", "ffmpeg",
             "--downloader-args", f"ffmpeg_i:-t {duration}",
             "-f", "best",
             url,
-            "-o", str(out_file)
+            "-o", "-"
         ]
-        proc = await self._run_subprocess(*cmd)
-        stdout, stderr = await proc.communicate()
-        if proc.returncode == 0:
-            logging.info("🎬 Clip creado: %s", out_file)
-        else:
+        proc, muxer = await self._run_muxed(*cmd)
+        _, stderr, mux_err = await asyncio.gather(
+            self._write_stream(muxer.stdout, out_file), proc.stderr.read(), muxer.stderr.read()
+        )
+        await proc.wait()
+        await muxer.wait()
+        if proc.returncode != 0:
             logging.warning("⚠ Error creando clip para %s (code=%s)", model_name, proc.returncode)
             logging.debug("stderr: %s", (stderr or b"").decode(errors="ignore"))
+        elif muxer.returncode != 0:
+            # un MP4 a medio escribir no debe enviarse como clip
+            logging.warning("⚠ ffmpeg finalizó con código %s creando clip para %s", muxer.returncode, model_name)
+            logging.debug("ffmpeg stderr: %s", (mux_err or b"").decode(errors="ignore"))
+            raise RuntimeError(f"Clip fallido para {model_name}: ffmpeg={muxer.returncode}")
+        else:
+            logging.info("🎬 Clip creado: %s", out_file)
         return out_file
 
     async def _is_online_via_ytdlp(self, url: str) -> bool:
@@ -201,22 +556,15 @@ class RecorderManager:
             while True:
                 try:
                     # si ya está grabando, esperar un poco y seguir
-                    if model_name in self.recordings:
+                    if model_name in self.recordings or model_name in self._starting:
                         logging.debug("%s ya está grabando; check en %ss", model_name, poll_interval)
                         await asyncio.sleep(poll_interval)
                         continue
                     online = await self._is_online_via_ytdlp(url)
                     if online:
                         logging.info("🔔 %s está ONLINE — iniciando grabación automática", model_name)
-
-                        async def _safe_record():
-                            try:
-                                await self.record_stream(url, model_name)
-                            except Exception as ex:  # pragma: no cover - solo logging
-                                logging.error("Error grabando %s: %s", model_name, ex)
-
                         # arrancar la grabación en background y no bloquear el loop de monitor
-                        asyncio.create_task(_safe_record())
+                        self.start_recording(url, model_name)
                         # esperar un tiempo mayor tras detectar online para evitar reintentos excesivos
                         await asyncio.sleep(max(poll_interval, 30))
                     else:
@@ -253,9 +601,20 @@ class RecorderManager:
             out[m] = "running" if not t.done() else "done"
         return out
 
+    def list_qualities(self) -> Dict[str, str]:
+        """Variante en uso por cada grabación (model -> format_id)."""
+        return {m: r.variant.format_id if r.variant else "best" for m, r in self.recordings.items()}
+
+    def recording_status(self, model_name: str) -> Optional[Tuple[int, float]]:
+        """(bytes escritos, segundos) de la sesión en curso de *model_name*, o None si no graba."""
+        rec = self.recordings.get(model_name)
+        if rec is None:
+            return None
+        return rec.bytes_before + rec.bytes_written, time.monotonic() - rec.started
+
     def list_recordings(self) -> Dict[str, str]:
-        """Lista grabaciones en curso (model -> out path)."""
-        return {m: str(r.out_path) for m, r in self.recordings.items()}
+        """Lista grabaciones en curso (model -> rutas de sus partes, separadas por comas)."""
+        return {m: ", ".join(str(p) for p in r.parts) for m, r in self.recordings.items()}
 
 
 # Crear una instancia compartida
@@ -0,0 +1,444 @@
+"""Run :class:`recorder.RecorderManager` sharded across worker processes.
+
+A single asyncio loop has to drive every monitor, subprocess pipe and waiter of
+the recorder. On hosts with many cores that loop saturates long before the
+network does, so :class:`ShardedRecorder` spawns ``N`` worker processes, each
+owning its own event loop and ``RecorderManager``. Models are assigned to a
+shard by a stable hash of their name, so every command for the same model
+reaches the same process.
+
+The parent talks to the shards over :func:`multiprocessing.Pipe` using small
+request/response dicts::
+
+    {"id": 3, "op": "start_monitor", "args": {...}}   # parent -> shard
+    {"id": 3, "ok": True, "result": None}              # shard -> parent
+
+Recording quality is balanced by the parent: load is measured host-wide and
+priorities only make sense across every recording, so a single
+:class:`quality.QualityPolicy` collects the stream states of all shards and
+tells the owning shard which recordings to switch. The same load and states
+are sent with ``start_recording`` and pushed to every shard on each round, so
+a shard never picks an initial variant from its own, unprimed load monitor.
+
+A shard whose pipe closes unexpectedly is respawned after a short delay. Its
+recordings and monitors are lost; meanwhile, commands for its models fail and
+the listings show only the live shards.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import itertools
+import logging
+import multiprocessing
+import threading
+import zlib
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import CLIP_DURATION, MONITOR_POLL_INTERVAL, QUALITY_CHECK_INTERVAL, RECORDER_SHARDS
+from quality import LoadMonitor, QualityPolicy, StreamState
+
+__all__ = ["ShardError", "ShardedRecorder", "shard_for"]
+
+# Operations a shard accepts; each maps to a ``RecorderManager`` method.
+_OPS = frozenset({
+    "start_recording",
+    "stop_recording",
+    "record_clip",
+    "start_monitor",
+    "stop_monitor",
+    "list_recordings",
+    "list_monitors",
+    "list_qualities",
+    "recording_status",
+    "set_priority",
+    "set_load_hint",
+    "stream_states",
+    "switch_variant",
+})
+
+
+# Seconds to wait before replacing a dead shard, so a shard that dies on
+# startup is not respawned in a tight loop.
+_RESPAWN_DELAY = 1.0
+
+
+class ShardError(RuntimeError):
+    """Raised when a shard fails a command or is no longer reachable."""
+
+
+def shard_for(model_name: str, shards: int) -> int:
+    """Return the shard index in ``range(shards)`` that owns *model_name*."""
+    return zlib.crc32(model_name.encode("utf-8")) % shards
+
+
+def _start_reader(conn: Connection, on_message: Callable[[Any], None], on_close: Callable[[], None]) -> None:
+    """Read *conn* in a daemon thread, handing each message to *on_message*.
+
+    A dedicated thread per pipe avoids tying up the loop's default executor
+    with blocking ``recv`` calls, which would starve it with many shards.
+    """
+    def run() -> None:
+        try:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    break
+                on_message(msg)
+            on_close()
+        except RuntimeError:
+            # the event loop was closed while the pipe was still open
+            pass
+
+    threading.Thread(target=run, name="shard-reader", daemon=True).start()
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def _shard_main(
+    conn: Connection,
+    shard_id: int,
+    initializer: Optional[Callable[..., None]],
+    initargs: Sequence[Any],
+) -> None:
+    """Entry point of a shard process."""
+    if initializer is not None:
+        initializer(*initargs)
+    try:
+        asyncio.run(_serve(conn, shard_id))
+    except KeyboardInterrupt:  # pragma: no cover - Ctrl+C reaches all processes
+        pass
+
+
+async def _serve(conn: Connection, shard_id: int) -> None:
+    """Process commands from *conn* until ``shutdown`` or the pipe closes."""
+    # Imported here so an ``initializer`` can adjust configuration first.
+    from recorder import RecorderManager
+
+    # the parent rebalances quality across all shards
+    manager = RecorderManager(quality_loop=False)
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+    handlers = set()
+    _start_reader(
+        conn,
+        lambda msg: loop.call_soon_threadsafe(inbox.put_nowait, msg),
+        lambda: loop.call_soon_threadsafe(inbox.put_nowait, None),
+    )
+    logging.info("Shard %s listo", shard_id)
+
+    async def handle(msg: Dict[str, Any]) -> None:
+        op = msg.get("op")
+        try:
+            if op not in _OPS:
+                raise ShardError(f"operación desconocida: {op!r}")
+            result = getattr(manager, op)(**msg.get("args", {}))
+            if inspect.isawaitable(result):
+                result = await result
+            reply = {"id": msg["id"], "ok": True, "result": result}
+        except Exception as ex:
+            reply = {"id": msg["id"], "ok": False, "error": f"{type(ex).__name__}: {ex}"}
+        try:
+            conn.send(reply)
+        except (BrokenPipeError, OSError):
+            pass
+
+    shutdown_id = None
+    while True:
+        msg = await inbox.get()
+        if msg is None:
+            break
+        if msg.get("op") == "shutdown":
+            shutdown_id = msg["id"]
+            break
+        task = asyncio.create_task(handle(msg))
+        handlers.add(task)
+        task.add_done_callback(handlers.discard)
+
+    for model_name in list(manager.monitor_tasks):
+        await manager.stop_monitor(model_name)
+    # each stop may wait seconds for yt-dlp to exit; do them all at once
+    await manager.stop_all()
+    for task in list(handlers):
+        task.cancel()
+    if shutdown_id is not None:
+        try:
+            conn.send({"id": shutdown_id, "ok": True, "result": None})
+        except (BrokenPipeError, OSError):
+            pass
+    conn.close()
+    logging.info("Shard %s detenido", shard_id)
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+class _ShardClient:
+    """Parent-side handle of one shard process."""
+
+    def __init__(self, ctx, shard_id: int, initializer, initargs) -> None:
+        self.shard_id = shard_id
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_shard_main,
+            args=(child_conn, shard_id, initializer, tuple(initargs)),
+            name=f"recorder-shard-{shard_id}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self._ids = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._send_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed = False
+
+    def attach(self, loop: asyncio.AbstractEventLoop, on_close: Optional[Callable[[], None]] = None) -> None:
+        """Start delivering replies to futures on *loop*.
+
+        *on_close* runs on *loop* once the pipe closes and pending calls failed.
+        """
+        self._loop = loop
+
+        def closed() -> None:
+            self._fail_pending()
+            if on_close is not None:
+                on_close()
+
+        _start_reader(
+            self.conn,
+            lambda msg: loop.call_soon_threadsafe(self._resolve, msg),
+            lambda: loop.call_soon_threadsafe(closed),
+        )
+
+    def _resolve(self, msg: Dict[str, Any]) -> None:
+        fut = self._pending.pop(msg["id"], None)
+        if fut is None or fut.done():
+            return
+        if msg["ok"]:
+            fut.set_result(msg["result"])
+        else:
+            fut.set_exception(ShardError(f"shard {self.shard_id}: {msg['error']}"))
+
+    def _fail_pending(self) -> None:
+        self._closed = True
+        pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(ShardError(f"shard {self.shard_id} terminado"))
+
+    async def call(self, op: str, **args: Any) -> Any:
+        """Send *op* to the shard and wait for its result."""
+        if self._closed or self._loop is None:
+            raise ShardError(f"shard {self.shard_id} no disponible")
+        req_id = next(self._ids)
+        fut = self._loop.create_future()
+        self._pending[req_id] = fut
+        try:
+            with self._send_lock:
+                self.conn.send({"id": req_id, "op": op, "args": args})
+        except (BrokenPipeError, OSError) as ex:
+            self._pending.pop(req_id, None)
+            raise ShardError(f"shard {self.shard_id} no disponible: {ex}") from ex
+        return await fut
+
+
+class ShardedRecorder:
+    """Front-end that distributes recorder commands over worker processes.
+
+    The public coroutines mirror :class:`recorder.RecorderManager` so the
+    Telegram handlers do not care how many shards are running. ``initializer``
+    and ``initargs`` behave like those of :class:`multiprocessing.pool.Pool`
+    and run in every shard before its ``RecorderManager`` is created.
+    ``quality`` and ``load`` drive the host-wide quality rebalancing.
+    """
+
+    def __init__(
+        self,
+        shards: int = RECORDER_SHARDS,
+        initializer: Optional[Callable[..., None]] = None,
+        initargs: Sequence[Any] = (),
+    ) -> None:
+        if shards < 1:
+            raise ValueError("shards debe ser >= 1")
+        self.shards = shards
+        self._initializer = initializer
+        self._initargs = initargs
+        self._clients: List[_ShardClient] = []
+        self.quality = QualityPolicy()
+        self.load = LoadMonitor()
+        self._quality_task: Optional[asyncio.Task] = None
+        self._respawns: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """Spawn the shard processes."""
+        if self._clients:
+            return
+        # "spawn" avoids forking a process that already runs threads and a loop
+        ctx = multiprocessing.get_context("spawn")
+        loop = asyncio.get_running_loop()
+        for shard_id in range(self.shards):
+            self._clients.append(self._spawn(ctx, shard_id, loop))
+        self.load.sample()  # first reference point for the rates
+        self._quality_task = asyncio.create_task(self._quality_loop())
+        logging.info("🧩 %s shard(s) de grabación iniciados", self.shards)
+
+    def _spawn(self, ctx, shard_id: int, loop: asyncio.AbstractEventLoop) -> _ShardClient:
+        client = _ShardClient(ctx, shard_id, self._initializer, self._initargs)
+        client.attach(loop, lambda: self._on_shard_closed(client))
+        return client
+
+    def _on_shard_closed(self, client: _ShardClient) -> None:
+        if client not in self._clients:
+            return  # closed on purpose
+        logging.warning("Shard %s terminado; se relanza", client.shard_id)
+        task = asyncio.create_task(self._respawn(client))
+        self._respawns.add(task)
+        task.add_done_callback(self._respawns.discard)
+
+    async def _respawn(self, dead: _ShardClient) -> None:
+        """Replace *dead* with a fresh shard process at the same index."""
+        await asyncio.sleep(_RESPAWN_DELAY)
+        if dead.process.is_alive():
+            dead.process.kill()
+        await asyncio.to_thread(dead.process.join, 5)
+        dead.conn.close()
+        if dead not in self._clients:
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self._clients[dead.shard_id] = self._spawn(ctx, dead.shard_id, asyncio.get_running_loop())
+        logging.info("🧩 Shard %s relanzado", dead.shard_id)
+
+    async def close(self, timeout: float = 30) -> None:
+        """Stop every shard, letting them finish their recordings cleanly."""
+        clients, self._clients = self._clients, []
+        if self._quality_task is not None:
+            self._quality_task.cancel()
+            self._quality_task = None
+        for task in list(self._respawns):
+            task.cancel()
+
+        async def _stop(client: _ShardClient) -> None:
+            try:
+                await asyncio.wait_for(client.call("shutdown"), timeout=timeout)
+            except (ShardError, asyncio.TimeoutError):
+                pass
+            await asyncio.to_thread(client.process.join, 5)
+            if client.process.is_alive():
+                client.process.kill()
+            client.conn.close()
+
+        await asyncio.gather(*(_stop(c) for c in clients))
+
+    async def __aenter__(self) -> "ShardedRecorder":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _client_for(self, model_name: str) -> _ShardClient:
+        if not self._clients:
+            raise ShardError("ShardedRecorder no iniciado")
+        return self._clients[shard_for(model_name, len(self._clients))]
+
+    async def start_recording(self, url: str, model_name: str) -> bool:
+        """Start recording *model_name* in the background on its shard.
+
+        The shard picks the initial variant from the host load and the
+        recordings of every shard, as measured here.
+        """
+        client = self._client_for(model_name)
+        load, states = self.load.peek(), await self._stream_states()
+        return await client.call("start_recording", url=url, model_name=model_name, load=load, others=states)
+
+    async def stop_recording(self, model_name: str) -> bool:
+        """Stop the recording of *model_name*; ``False`` if it was not recording."""
+        return await self._client_for(model_name).call("stop_recording", model_name=model_name)
+
+    async def record_clip(self, url: str, model_name: str, duration: int = CLIP_DURATION) -> Path:
+        """Record a clip of *duration* seconds and return its path."""
+        return await self._client_for(model_name).call(
+            "record_clip", url=url, model_name=model_name, duration=duration
+        )
+
+    async def recording_status(self, model_name: str) -> Optional[Tuple[int, float]]:
+        """Bytes written and seconds elapsed of the recording of *model_name*, or ``None``."""
+        return await self._client_for(model_name).call("recording_status", model_name=model_name)
+
+    async def start_monitor(self, model_name: str, url: str, poll_interval: int = MONITOR_POLL_INTERVAL) -> None:
+        """Start monitoring *model_name* on its shard."""
+        await self._client_for(model_name).call(
+            "start_monitor", model_name=model_name, url=url, poll_interval=poll_interval
+        )
+
+    async def stop_monitor(self, model_name: str) -> bool:
+        """Stop the monitor of *model_name*; ``False`` if none was active."""
+        return await self._client_for(model_name).call("stop_monitor", model_name=model_name)
+
+    async def set_priority(self, model_name: str, priority: int) -> None:
+        """Set the quality priority of *model_name* (higher keeps quality longer)."""
+        await self._client_for(model_name).call("set_priority", model_name=model_name, priority=priority)
+
+    async def _gather_live(self, op: str, **args: Any) -> List[Any]:
+        """Call *op* on every shard, skipping (and logging) the unreachable ones."""
+        clients = list(self._clients)
+        results = await asyncio.gather(*(c.call(op, **args) for c in clients), return_exceptions=True)
+        live = []
+        for client, result in zip(clients, results):
+            if isinstance(result, ShardError):
+                logging.warning("Shard %s omitido en %s: %s", client.shard_id, op, result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                live.append(result)
+        return live
+
+    async def _stream_states(self) -> List[StreamState]:
+        states: List[StreamState] = []
+        for result in await self._gather_live("stream_states"):
+            states.extend(result)
+        return states
+
+    async def _quality_loop(self) -> None:
+        """Rebalance the variants of every recording on every shard."""
+        while True:
+            await asyncio.sleep(QUALITY_CHECK_INTERVAL)
+            try:
+                states = await self._stream_states()
+                load = self.load.sample()
+                changes = self.quality.rebalance(states, load) if states else {}
+                for model_name, variant in changes.items():
+                    await self._client_for(model_name).call(
+                        "switch_variant", model_name=model_name, format_id=variant.format_id
+                    )
+                # shards starting recordings on their own (monitors) choose from this
+                await self._gather_live("set_load_hint", load=load, others=states)
+            except ShardError as ex:
+                logging.warning("No se pudo reequilibrar la calidad: %s", ex)
+
+    async def _collect(self, op: str) -> Dict[str, str]:
+        if not self._clients:
+            raise ShardError("ShardedRecorder no iniciado")
+        merged: Dict[str, str] = {}
+        for result in await self._gather_live(op):
+            merged.update(result)
+        return merged
+
+    async def list_recordings(self) -> Dict[str, str]:
+        """Aggregate ``list_recordings`` from every shard."""
+        return await self._collect("list_recordings")
+
+    async def list_monitors(self) -> Dict[str, str]:
+        """Aggregate ``list_monitors`` from every shard."""
+        return await self._collect("list_monitors")
+
+    async def list_qualities(self) -> Dict[str, str]:
+        """Aggregate the format each recording currently uses."""
+        return await self._collect("list_qualities")
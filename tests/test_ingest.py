@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+
+import ingest
+from cache import DownloadCache, normalize_url
+
+
+class FakeProcess:
+    """Fake yt-dlp that writes *payload* into the ``-P`` directory."""
+    def __init__(self, cmd, payload: bytes, returncode: int = 0):
+        self.returncode = returncode
+        self._cmd = cmd
+        self._payload = payload
+
+    async def communicate(self):
+        if self.returncode != 0:
+            return b"", b"boom"
+        workdir = Path(self._cmd[self._cmd.index("-P") + 1])
+        out = workdir / "media.mp4"
+        out.write_bytes(self._payload)
+        return f"{out}\n".encode(), b""
+
+
+def test_normalize_url_drops_noise():
+    assert normalize_url("HTTPS://Example.com:443/v/1/?utm_source=x&b=2&a=1#t=3") == (
+        "https://example.com/v/1?a=1&b=2"
+    )
+    assert normalize_url("http://example.com:8080/") == "http://example.com:8080/"
+
+
+@pytest.mark.asyncio
+async def test_download_is_served_from_cache(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_exec(*cmd, **kwargs):
+        calls.append(cmd)
+        return FakeProcess(cmd, b"video-bytes")
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1024)
+
+    first = await ingest.download("https://example.com/vod?utm_source=a", tmp_path / "a", cache=cache)
+    second = await ingest.download("https://EXAMPLE.com/vod/", tmp_path / "b", cache=cache)
+
+    assert len(calls) == 1
+    assert "--concurrent-fragments" in calls[0]
+    assert first == tmp_path / "a.mp4"
+    assert second.read_bytes() == b"video-bytes"
+    assert first.stat().st_ino == second.stat().st_ino
+    assert ingest._key_locks == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_download_keeps_partial_dir(monkeypatch, tmp_path):
+    async def fake_exec(*cmd, **kwargs):
+        return FakeProcess(cmd, b"", returncode=1)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+    cache = DownloadCache(tmp_path / "cache")
+
+    with pytest.raises(RuntimeError):
+        await ingest.download("https://example.com/vod", tmp_path / "a.mp4", cache=cache)
+    assert cache.partial_dir(cache.key("https://example.com/vod")).is_dir()
+    assert cache.lookup(cache.key("https://example.com/vod")) is None
+
+
+@pytest.mark.asyncio
+async def test_cancelled_download_kills_ytdlp(monkeypatch, tmp_path):
+    class HangingProcess:
+        returncode = None
+
+        async def communicate(self):
+            await asyncio.sleep(3600)
+
+        def kill(self):
+            self.returncode = -9
+
+        async def wait(self):
+            return self.returncode
+
+    proc = HangingProcess()
+
+    async def fake_exec(*cmd, **kwargs):
+        return proc
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+    cache = DownloadCache(tmp_path / "cache")
+
+    task = asyncio.create_task(ingest.download("https://example.com/vod", tmp_path / "a.mp4", cache=cache))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert proc.returncode == -9
+    assert ingest._key_locks == {}
+
+
+@pytest.mark.asyncio
+async def test_delivery_copies_off_the_loop(monkeypatch, tmp_path):
+    async def fake_exec(*cmd, **kwargs):
+        return FakeProcess(cmd, b"video-bytes")
+
+    threads = []
+    link_or_copy = ingest.link_or_copy
+
+    def recording_link(src, dst):
+        threads.append(threading.current_thread())
+        return link_or_copy(src, dst)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+    monkeypatch.setattr(ingest, "link_or_copy", recording_link)
+    cache = DownloadCache(tmp_path / "cache")
+
+    await ingest.download("https://example.com/vod", tmp_path / "a", cache=cache)
+    await ingest.download("https://example.com/vod", tmp_path / "b", cache=cache)
+
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = DownloadCache(tmp_path / "cache", max_bytes=10)
+    for name in ("a", "b", "c"):
+        src = tmp_path / f"{name}.mp4"
+        src.write_bytes(name.encode() * 4)
+        cache.store(name, src)
+        if name == "b":
+            cache.lookup("a")  # refresh "a" so "b" becomes the oldest
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None
+    assert cache.lookup("c") is not None
+    assert cache.size == 8
+
+    reopened = DownloadCache(tmp_path / "cache", max_bytes=10)
+    assert reopened.lookup("c") is not None
@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import pytest
+from telethon.errors import FloodWaitError
+from telethon.tl.functions.messages import EditMessageRequest, SendMessageRequest
+
+from progress import ProgressReporter, report_elapsed, report_recording, upload_progress
+
+
+class FakeClient:
+    """Records edits and sends; optionally answers with a flood wait once per chat.
+
+    Like Telethon, a flood wait up to ``flood_sleep_threshold`` (60 s by
+    default) is slept through inside the call instead of being raised.
+    """
+    flood_sleep_threshold = 60
+
+    def __init__(self, flood_chats=(), flood_seconds=1):
+        self.edits = []
+        self.sends = []
+        self.slept = 0
+        self._flood = set(flood_chats)
+        self._flood_seconds = flood_seconds
+
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        if flood_sleep_threshold is None:
+            flood_sleep_threshold = self.flood_sleep_threshold
+        if request.peer in self._flood:
+            self._flood.discard(request.peer)
+            if self._flood_seconds > flood_sleep_threshold:
+                raise FloodWaitError(request=request, capture=self._flood_seconds)
+            self.slept += self._flood_seconds
+            await asyncio.sleep(self._flood_seconds)
+        if isinstance(request, EditMessageRequest):
+            self.edits.append((request.peer, request.id, request.message))
+        elif isinstance(request, SendMessageRequest):
+            self.sends.append((request.peer, request.message))
+
+
+@pytest.mark.asyncio
+async def test_updates_are_coalesced_per_message():
+    client = FakeClient()
+    reporter = ProgressReporter(client, min_interval=0.2, edits_per_second=100, batch_window=0.05)
+    await reporter.start()
+    for i in range(50):
+        reporter.update(1, 10, f"{i}%")
+        await asyncio.sleep(0.01)
+    reporter.finish(1, 10, "done")
+    await reporter.close()
+
+    texts = [text for _, _, text in client.edits]
+    assert texts[-1] == "done"
+    assert len(texts) <= 5
+
+
+@pytest.mark.asyncio
+async def test_global_budget_limits_edits_across_chats():
+    client = FakeClient()
+    reporter = ProgressReporter(client, min_interval=0, edits_per_second=20, batch_window=0.05)
+    await reporter.start()
+    for chat in range(20):
+        reporter.update(chat, 1, "working")
+    await asyncio.sleep(0.25)
+    sent = len(client.edits)
+    await reporter.close()
+
+    assert 3 <= sent <= 8
+    assert len(client.edits) == 20
+
+
+@pytest.mark.asyncio
+async def test_completion_notices_are_batched():
+    client = FakeClient()
+    reporter = ProgressReporter(client, min_interval=0, edits_per_second=100, batch_window=0.1)
+    await reporter.start()
+    reporter.notify(5, "clip a listo")
+    reporter.notify(5, "clip b listo")
+    reporter.notify(6, "clip c listo")
+    await reporter.close()
+
+    assert sorted(client.sends) == [(5, "clip a listo\nclip b listo"), (6, "clip c listo")]
+
+
+@pytest.mark.asyncio
+async def test_flood_wait_pauses_only_that_chat():
+    client = FakeClient(flood_chats={1})
+    reporter = ProgressReporter(client, min_interval=0, edits_per_second=50, batch_window=0.05)
+    await reporter.start()
+    reporter.update(1, 1, "first")
+    await asyncio.sleep(0.05)
+    reporter.update(1, 1, "latest")
+    reporter.update(2, 1, "other chat")
+    await asyncio.sleep(0.2)
+
+    assert client.edits == [(2, 1, "other chat")]
+    assert reporter.rate < reporter.max_rate
+
+    await reporter.close(timeout=3)
+    assert client.edits[-1] == (1, 1, "latest")
+
+
+@pytest.mark.asyncio
+async def test_short_flood_wait_is_not_slept_inside_telethon():
+    # 30 s is below Telethon's default threshold: it would stall the edit
+    client = FakeClient(flood_chats={1}, flood_seconds=30)
+    reporter = ProgressReporter(client, min_interval=0, edits_per_second=50, batch_window=0.05)
+    await reporter.start()
+    reporter.update(1, 1, "first")
+    await asyncio.sleep(0.05)
+
+    assert client.slept == 0
+    assert reporter.rate < reporter.max_rate
+    assert reporter._blocked[1] > time.monotonic() + 20
+    await reporter.close(timeout=0.1)
+
+
+@pytest.mark.asyncio
+async def test_report_elapsed_ticks_and_returns_result():
+    client = FakeClient()
+    reporter = ProgressReporter(client, min_interval=0, edits_per_second=100, batch_window=0.05)
+    await reporter.start()
+    handle = reporter.track(type("Msg", (), {"chat_id": 3, "id": 7})())
+
+    async def job():
+        await asyncio.sleep(0.25)
+        return "ok"
+
+    assert await report_elapsed(handle, "clip", job(), total=30, interval=0.1) == "ok"
+    await reporter.close()
+    assert client.edits and client.edits[0][2].startswith("clip (0s/30s)")
+
+
+@pytest.mark.asyncio
+async def test_report_recording_shows_size_until_it_stops():
+    client = FakeClient()
+    reporter = ProgressReporter(client, min_interval=0, edits_per_second=100, batch_window=0.05)
+    await reporter.start()
+    handle = reporter.track(type("Msg", (), {"chat_id": 3, "id": 7})())
+    statuses = iter([(512, 5.0), (3 * 1024 * 1024, 65.0), None])
+
+    async def status():
+        return next(statuses)
+
+    await report_recording(handle, "rec", status, interval=0.1)
+    await reporter.close()
+    texts = [text for _, _, text in client.edits]
+    assert texts[-1] == "rec: finalizada (3.0 MB, 0:01:05)"
+
+
+@pytest.mark.asyncio
+async def test_upload_progress_reports_percentage():
+    client = FakeClient()
+    reporter = ProgressReporter(client, min_interval=0, edits_per_second=100, batch_window=0.05)
+    await reporter.start()
+    handle = reporter.track(type("Msg", (), {"chat_id": 3, "id": 7})())
+    callback = upload_progress(handle, "up")
+    callback(512 * 1024, 2048 * 1024)
+    await asyncio.sleep(0.1)
+    await reporter.close()
+    assert client.edits[-1][2] == "up 25% (512.0 KB/2.0 MB)"
@@ -0,0 +1,326 @@
+import asyncio
+import json
+import signal
+
+import pytest
+
+import recorder
+from quality import LoadMonitor, LoadSample, QualityPolicy, StreamState, Variant, parse_variants
+
+LOW = Variant("lo", 1_000_000)
+MID = Variant("mid", 3_000_000)
+HIGH = Variant("hi", 6_000_000)
+VARIANTS = (LOW, MID, HIGH)
+MB = 1_000_000
+
+
+def _policy():
+    # 10 MB/s of network and disk; byte rates: lo=0.125, mid=0.375, hi=0.75 MB/s
+    return QualityPolicy(net_capacity_bps=10 * MB, disk_capacity_bps=10 * MB, high_watermark=0.8, low_watermark=0.5)
+
+
+def _load(mb_per_s):
+    return LoadSample(mb_per_s * MB, mb_per_s * MB)
+
+
+def test_parse_variants_sorts_and_skips_audio_and_video_only():
+    info = {"formats": [
+        {"format_id": "720p", "tbr": 3000, "height": 720, "vcodec": "avc1"},
+        {"format_id": "audio", "tbr": 128, "vcodec": "none"},
+        {"format_id": "1080p-video", "tbr": 6000, "height": 1080, "vcodec": "avc1", "acodec": "none"},
+        {"format_id": "240p", "tbr": 500, "height": 240, "vcodec": "avc1"},
+        {"format_id": "unknown"},
+    ]}
+    assert [v.format_id for v in parse_variants(info)] == ["240p", "720p"]
+
+
+def test_select_uses_best_variant_that_fits():
+    policy = _policy()
+    assert policy.select("a", VARIANTS, _load(1)) == HIGH
+    assert policy.select("b", VARIANTS, _load(7.5)) == MID
+    assert policy.select("c", VARIANTS, _load(9.5)) == LOW
+    assert [d.new for d in policy.decisions] == ["hi", "mid", "lo"]
+
+
+def test_select_counts_headroom_of_lower_priority_streams():
+    policy = _policy()
+    others = [StreamState(f"low{i}", VARIANTS, HIGH, priority=0) for i in range(4)]
+    assert policy.select("vip", VARIANTS, _load(7.9), priority=0, others=others) == LOW
+    assert policy.select("vip", VARIANTS, _load(7.9), priority=5, others=others) == HIGH
+
+
+def test_rebalance_downgrades_lowest_priority_first():
+    policy = _policy()
+    states = [
+        StreamState("vip", VARIANTS, HIGH, priority=5),
+        StreamState("a", VARIANTS, HIGH, priority=0),
+        StreamState("b", VARIANTS, MID, priority=0),
+    ]
+    # 8.5 MB/s: a hi->mid frees 0.375, a mid->lo frees 0.25 → 7.875 <= 8
+    changes = policy.rebalance(states, _load(8.5))
+    assert changes == {"a": LOW}
+    assert "vip" not in changes
+
+
+def test_rebalance_upgrades_highest_priority_first_and_has_hysteresis():
+    policy = _policy()
+    states = [
+        StreamState("vip", VARIANTS, LOW, priority=5),
+        StreamState("a", VARIANTS, LOW, priority=0),
+    ]
+    # between the watermarks nothing moves
+    assert policy.rebalance(states, _load(6)) == {}
+    # above the high watermark there is nothing left to downgrade
+    assert policy.rebalance(states, _load(9)) == {}
+    # below the low watermark: one step per stream and round
+    assert policy.rebalance(states, _load(4)) == {"vip": MID, "a": MID}
+
+
+def test_rebalance_upgrade_stops_at_high_watermark():
+    policy = _policy()
+    states = [StreamState("vip", VARIANTS, MID, 5), StreamState("a", VARIANTS, MID, 0)]
+    assert policy.rebalance(states, _load(4.9)) == {"vip": HIGH, "a": HIGH}
+    # each mid->hi step adds 0.375 MB/s: only vip's fits under 5.3 MB/s
+    tight = QualityPolicy(10 * MB, 10 * MB, high_watermark=0.53, low_watermark=0.5)
+    assert tight.rebalance(states, _load(4.9)) == {"vip": HIGH}
+
+
+def test_load_monitor_reports_rates():
+    values = iter([(0, 0), (10 * MB, 20 * MB)])
+    monitor = LoadMonitor(lambda: next(values))
+    assert monitor.sample() == LoadSample()
+    sample = monitor.sample()
+    assert sample.net_bps > 0 and sample.disk_bps == pytest.approx(2 * sample.net_bps)
+
+
+class _Reader(asyncio.StreamReader):
+    def __init__(self, data=b"", eof=True):
+        super().__init__()
+        self.feed_data(data)
+        if eof:
+            self.feed_eof()
+
+
+class ProbeProcess:
+    def __init__(self, info):
+        self.returncode = 0
+        self.pid = 1
+        self.stdout = _Reader(json.dumps(info).encode())
+        self.stderr = _Reader()
+
+    async def wait(self):
+        return 0
+
+
+class SegmentProcess:
+    """Streams *data* and, unless *finite*, keeps running until SIGINT."""
+    def __init__(self, data, finite):
+        self.pid = 2
+        self.returncode = 0 if finite else None
+        self.stdout = _Reader(data, eof=finite)
+        self.stderr = _Reader(eof=finite)
+        self.signals = []
+
+    def send_signal(self, sig):
+        self.signals.append(sig)
+        if self.returncode is None:
+            self.returncode = 1
+            self.stdout.feed_eof()
+            self.stderr.feed_eof()
+
+    def terminate(self):
+        pass
+
+    def kill(self):
+        pass
+
+    async def wait(self):
+        while self.returncode is None:
+            await asyncio.sleep(0.01)
+        return self.returncode
+
+
+@pytest.mark.asyncio
+async def test_recording_switches_variant_at_segment_boundary(monkeypatch, tmp_path):
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(recorder, "QUALITY_CHECK_INTERVAL", 0.01)
+    manager = recorder.RecorderManager()
+    manager.quality = _policy()
+    # idle for the initial selection, then saturated
+    counters = iter([(0, 0), (0, 0)])
+    manager.load = LoadMonitor(lambda: next(counters, (10 ** 15, 10 ** 15)))
+
+    info = {"formats": [
+        {"format_id": "lo", "tbr": 1000, "vcodec": "avc1"},
+        {"format_id": "hi", "tbr": 6000, "vcodec": "avc1"},
+    ]}
+    launched = []
+    listings = []
+    statuses = []
+
+    async def fake_exec(*cmd, **kwargs):
+        if "-J" in cmd:
+            return ProbeProcess(info)
+        if cmd[0] == recorder.FFMPEG_PATH:
+            # the muxer mirrors its yt-dlp source: same output, same lifetime
+            return launched[-1][1]
+        fmt = cmd[cmd.index("-f") + 1]
+        if launched:
+            listings.append(manager.list_recordings())
+            statuses.append(manager.recording_status("model"))
+        proc = SegmentProcess(f"segment-{fmt}".encode(), finite=(fmt == "lo"))
+        launched.append((fmt, proc))
+        return proc
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    result = await asyncio.wait_for(manager.record_stream("http://example.com", "model"), timeout=5)
+
+    assert [fmt for fmt, _ in launched] == ["hi", "lo"]
+    assert launched[0][1].signals == [signal.SIGINT]
+    first = next(p for p in tmp_path.glob("model_*.mp4") if "_part" not in p.name)
+    assert first.read_bytes() == b"segment-hi"
+    assert result.name.endswith("_part1.mp4")
+    assert result.read_bytes() == b"segment-lo"
+    assert listings == [{"model": f"{first}, {result}"}]
+    # size and duration carry over the rollover
+    assert statuses[0][0] == len(b"segment-hi") and statuses[0][1] >= 0
+    assert manager.recording_status("model") is None
+    assert [(d.old, d.new) for d in manager.quality.decisions] == [(None, "hi"), ("hi", "lo")]
+    assert manager.recordings == {}
+
+
+@pytest.mark.asyncio
+async def test_stop_during_segment_switch_stops_new_segment(monkeypatch, tmp_path):
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(recorder, "QUALITY_CHECK_INTERVAL", 0.01)
+    manager = recorder.RecorderManager()
+    manager.quality = _policy()
+    counters = iter([(0, 0), (0, 0)])
+    manager.load = LoadMonitor(lambda: next(counters, (10 ** 15, 10 ** 15)))
+
+    info = {"formats": [
+        {"format_id": "lo", "tbr": 1000, "vcodec": "avc1"},
+        {"format_id": "hi", "tbr": 6000, "vcodec": "avc1"},
+    ]}
+    launched = []
+    stops = []
+
+    async def fake_exec(*cmd, **kwargs):
+        if "-J" in cmd:
+            return ProbeProcess(info)
+        if cmd[0] == recorder.FFMPEG_PATH:
+            return launched[-1][1]
+        fmt = cmd[cmd.index("-f") + 1]
+        if launched:
+            # /stop arrives while the next segment is being launched
+            stops.append(asyncio.create_task(manager.stop_recording("model")))
+            await asyncio.sleep(0)
+        proc = SegmentProcess(f"segment-{fmt}".encode(), finite=False)
+        launched.append((fmt, proc))
+        return proc
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    await asyncio.wait_for(manager.record_stream("http://example.com", "model"), timeout=5)
+
+    assert [fmt for fmt, _ in launched] == ["hi", "lo"]
+    assert launched[1][1].signals == [signal.SIGINT]
+    assert await stops[0] is True
+    assert manager.recordings == {}
+
+
+@pytest.mark.asyncio
+async def test_start_recording_reserves_model_during_probe(monkeypatch, tmp_path):
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    manager = recorder.RecorderManager()
+    probing = asyncio.Event()
+    release = asyncio.Event()
+    launched = []
+
+    async def fake_exec(*cmd, **kwargs):
+        if "-J" in cmd:
+            probing.set()
+            await release.wait()  # a slow 'yt-dlp -J'
+            return ProbeProcess({})
+        if cmd[0] == recorder.FFMPEG_PATH:
+            return launched[-1]
+        proc = SegmentProcess(b"data", finite=True)
+        launched.append(proc)
+        return proc
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    assert manager.start_recording("http://example.com", "model") is True
+    await probing.wait()
+    assert manager.start_recording("http://example.com", "model") is False
+    release.set()
+    await asyncio.wait_for(asyncio.gather(*manager._background), timeout=5)
+
+    assert len(launched) == 1
+    assert manager.start_recording("http://example.com", "model") is True
+    await asyncio.wait_for(asyncio.gather(*manager._background), timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_stop_during_probe_prevents_recording(monkeypatch, tmp_path):
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    manager = recorder.RecorderManager()
+    probing = asyncio.Event()
+    release = asyncio.Event()
+    launched = []
+
+    async def fake_exec(*cmd, **kwargs):
+        if "-J" in cmd:
+            probing.set()
+            await release.wait()
+            return ProbeProcess({})
+        launched.append(cmd)
+        return SegmentProcess(b"data", finite=False)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    assert manager.start_recording("http://example.com", "model") is True
+    await probing.wait()
+    assert await manager.stop_recording("model") is True
+    release.set()
+    await asyncio.wait_for(asyncio.gather(*manager._background), timeout=5)
+
+    assert launched == []
+    assert manager.recordings == {}
+    assert manager.start_recording("http://example.com", "model") is True
+    await manager.stop_all()
+    await asyncio.wait_for(asyncio.gather(*manager._background), timeout=5)
+    assert manager.recordings == {}
+
+
+@pytest.mark.asyncio
+async def test_shard_manager_selects_from_parent_load(monkeypatch, tmp_path):
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    manager = recorder.RecorderManager(quality_loop=False)
+    manager.quality = _policy()
+
+    def cold_monitor():
+        raise AssertionError("a shard must not sample its own load")
+
+    manager.load = LoadMonitor(cold_monitor)
+    info = {"formats": [
+        {"format_id": f.format_id, "tbr": f.bitrate / 1000, "vcodec": "avc1"} for f in VARIANTS
+    ]}
+
+    async def fake_exec(*cmd, **kwargs):
+        if "-J" in cmd:
+            return ProbeProcess(info)
+        return SegmentProcess(b"data", finite=True)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    # load pushed by the parent: mid fits under 8 MB/s, hi does not
+    manager.set_load_hint(_load(7.5), [])
+    await manager.record_stream("http://example.com/a", "a")
+    # the hint is not refreshed yet, but "a" now adds 0.375 MB/s
+    await manager.record_stream("http://example.com/b", "b")
+    # an explicit load from the parent wins over the hint
+    await manager.record_stream("http://example.com/c", "c", load=_load(1), others=[])
+
+    assert [(d.model, d.new) for d in manager.quality.decisions] == [("a", "mid"), ("b", "lo"), ("c", "hi")]
@@ -1,22 +1,34 @@
 import asyncio
+import hashlib
+import time
 from pathlib import Path
 
 import pytest
 
 import recorder
+from fs_utils import read_hash_sidecar
+
+
+def _reader(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
 
 
 class FakeProcess:
-    """Simple fake subprocess process for testing."""
-    def __init__(self, returncode: int, out_file: Path | None = None):
+    """Simple fake subprocess process for testing.
+
+    Like ``yt-dlp -o -`` it writes the media to stdout when it succeeds.
+    """
+    def __init__(self, returncode: int, data: bytes = b"media"):
         self.returncode = returncode
         self.pid = 123
-        self._out_file = out_file
+        self.stdout = _reader(data if returncode == 0 else b"")
+        self.stderr = _reader(b"")
 
-    async def communicate(self):
-        if self.returncode == 0 and self._out_file:
-            self._out_file.touch()
-        return b"", b""
+    async def wait(self):
+        return self.returncode
 
     def send_signal(self, sig):
         pass
@@ -35,10 +47,7 @@ async def test_record_stream_failure(monkeypatch, tmp_path):
     manager = recorder.RecorderManager()
 
     async def fake_exec(*cmd, **kwargs):
-        out_file = None
-        if "-o" in cmd:
-            out_file = Path(cmd[cmd.index("-o") + 1])
-        return FakeProcess(1, out_file)
+        return FakeProcess(1)
 
     monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
 
@@ -60,10 +69,7 @@ async def test_record_stream_success(monkeypatch, tmp_path):
     manager = recorder.RecorderManager()
 
     async def fake_exec(*cmd, **kwargs):
-        out_file = None
-        if "-o" in cmd:
-            out_file = Path(cmd[cmd.index("-o") + 1])
-        return FakeProcess(0, out_file)
+        return FakeProcess(0)
 
     monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
 
@@ -71,3 +77,122 @@ async def test_record_stream_success(monkeypatch, tmp_path):
     assert isinstance(result, Path)
     assert result.exists()
     assert result.parent == tmp_path
+
+
+@pytest.mark.asyncio
+async def test_record_stream_hashes_while_writing(monkeypatch, tmp_path):
+    """El hash del contenido se guarda junto al archivo sin releerlo."""
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(recorder, "STREAM_CHUNK_SIZE", 4)
+    manager = recorder.RecorderManager()
+    data = b"0123456789" * 10
+
+    async def fake_exec(*cmd, **kwargs):
+        return FakeProcess(0, data)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    result = await manager.record_stream("http://example.com", "model")
+    assert result.read_bytes() == data
+    assert read_hash_sidecar(result) == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_record_stream_muxes_to_fragmented_mp4(monkeypatch, tmp_path):
+    """yt-dlp entrega MPEG-TS a ffmpeg, que escribe MP4 fragmentado sin remux posterior."""
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    manager = recorder.RecorderManager()
+    calls = []
+
+    async def fake_exec(*cmd, **kwargs):
+        calls.append((cmd, kwargs))
+        return FakeProcess(0, b"fmp4" if cmd[0] == recorder.FFMPEG_PATH else b"")
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    result = await manager.record_stream("http://example.com", "model")
+
+    (ytdlp, ytdlp_kw), (ffmpeg, ffmpeg_kw) = [c for c in calls if "-J" not in c[0]]
+    assert ytdlp[ytdlp.index("-o") + 1] == "-"
+    assert isinstance(ytdlp_kw["stdout"], int) and isinstance(ffmpeg_kw["stdin"], int)
+    assert "frag_keyframe" in ffmpeg[ffmpeg.index("-movflags") + 1]
+    assert ffmpeg[ffmpeg.index("-c") + 1] == "copy"
+    assert result.read_bytes() == b"fmp4"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_write_closes_after_pending_chunk(monkeypatch, tmp_path):
+    """Al cancelar, el hash guardado corresponde a lo escrito aunque un bloque siguiera en el hilo."""
+    real_sha256 = hashlib.sha256
+    in_thread = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    class SlowDigest:
+        def __init__(self):
+            self._digest = real_sha256()
+
+        def update(self, chunk):
+            loop.call_soon_threadsafe(in_thread.set)
+            time.sleep(0.2)
+            self._digest.update(chunk)
+
+        def hexdigest(self):
+            return self._digest.hexdigest()
+
+    monkeypatch.setattr(recorder.hashlib, "sha256", SlowDigest)
+    out = tmp_path / "rec.mp4"
+    reader = asyncio.StreamReader()
+    reader.feed_data(b"chunk")
+    task = asyncio.create_task(recorder.RecorderManager()._write_stream(reader, out))
+    await in_thread.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert out.read_bytes() == b"chunk"
+    assert read_hash_sidecar(out) == real_sha256(b"chunk").hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_ffmpeg_failure_fails_recording_and_clip(monkeypatch, tmp_path):
+    """Un ffmpeg que falla invalida la grabación aunque yt-dlp termine bien."""
+    monkeypatch.setattr(recorder, "OUTPUT_DIR", tmp_path)
+    manager = recorder.RecorderManager()
+
+    async def fake_exec(*cmd, **kwargs):
+        proc = FakeProcess(0, b"fmp4")
+        if cmd[0] == recorder.FFMPEG_PATH:
+            proc.returncode = 1
+        return proc
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    with pytest.raises(RuntimeError, match="ffmpeg=1"):
+        await manager.record_stream("http://example.com", "model")
+    with pytest.raises(RuntimeError, match="ffmpeg=1"):
+        await manager.record_clip("http://example.com", "model", duration=1)
+
+
+@pytest.mark.asyncio
+async def test_source_is_reaped_when_muxer_cannot_start(monkeypatch):
+    manager = recorder.RecorderManager()
+    source = FakeProcess(0)
+    events = []
+    source.kill = lambda: events.append("kill")
+
+    async def wait():
+        events.append("wait")
+        return 0
+
+    source.wait = wait
+
+    async def fake_exec(*cmd, **kwargs):
+        if cmd[0] == recorder.FFMPEG_PATH:
+            raise FileNotFoundError(cmd[0])
+        return source
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+
+    with pytest.raises(FileNotFoundError):
+        await manager._run_muxed("yt-dlp", "-o", "-")
+    assert events == ["kill", "wait"]
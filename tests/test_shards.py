@@ -0,0 +1,165 @@
+import asyncio
+import sys
+
+import pytest
+
+import shards
+from quality import LoadSample, QualityPolicy
+
+MB = 1_000_000
+
+_FAKE_YTDLP = """\
+import json, sys, time
+if "-J" in sys.argv:
+    formats = [("lo", 1000), ("mid", 3000), ("hi", 6000)]
+    print(json.dumps({"formats": [{"format_id": f, "tbr": t, "vcodec": "avc1", "acodec": "mp4a"} for f, t in formats]}))
+    sys.exit(0)
+fmt = sys.argv[sys.argv.index("-f") + 1]
+try:
+    while True:
+        sys.stdout.buffer.write(fmt.encode())
+        sys.stdout.flush()
+        time.sleep(0.05)
+except KeyboardInterrupt:
+    sys.exit(1)
+"""
+
+
+def _configure(ytdlp_path: str, output_dir: str, ffmpeg_path: str = None) -> None:
+    """Shard initializer pointing the recorder at test paths."""
+    import recorder
+
+    recorder.YTDLP_PATH = ytdlp_path
+    recorder.OUTPUT_DIR = output_dir
+    if ffmpeg_path is not None:
+        recorder.FFMPEG_PATH = ffmpeg_path
+
+
+def _fake_tools(tmp_path):
+    """Write a yt-dlp that streams until SIGINT and a pass-through ffmpeg."""
+    script = tmp_path / "fake_ytdlp.py"
+    script.write_text(_FAKE_YTDLP)
+    ytdlp = tmp_path / "yt-dlp"
+    ytdlp.write_text(f"#!/bin/sh\nexec {sys.executable} {script} \"$@\"\n")
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text("#!/bin/sh\nexec cat\n")
+    for launcher in (ytdlp, ffmpeg):
+        launcher.chmod(0o755)
+    return str(ytdlp), str(ffmpeg)
+
+
+async def _until(predicate, timeout=20):
+    async def poll():
+        while not await predicate():
+            await asyncio.sleep(0.05)
+    await asyncio.wait_for(poll(), timeout)
+
+
+class _ScriptedLoad:
+    def __init__(self, *samples):
+        self._samples = list(samples)
+
+    def sample(self):
+        return self._samples.pop(0) if len(self._samples) > 1 else self._samples[0]
+
+
+def test_shard_for_is_stable_and_in_range():
+    names = [f"model{i}" for i in range(50)]
+    first = [shards.shard_for(n, 4) for n in names]
+    assert first == [shards.shard_for(n, 4) for n in names]
+    assert set(first) <= set(range(4))
+    assert len(set(first)) > 1
+
+
+@pytest.mark.asyncio
+async def test_monitors_are_aggregated_across_shards(tmp_path):
+    missing = str(tmp_path / "no-yt-dlp")
+    async with shards.ShardedRecorder(2, _configure, (missing, str(tmp_path))) as rec:
+        models = [f"model{i}" for i in range(6)]
+        for m in models:
+            await rec.start_monitor(m, f"http://example.com/{m}", poll_interval=60)
+
+        monitors = await rec.list_monitors()
+        assert monitors == {m: "running" for m in models}
+        assert await rec.list_recordings() == {}
+
+        assert await rec.stop_monitor("model0") is True
+        assert await rec.stop_monitor("model0") is False
+        assert "model0" not in await rec.list_monitors()
+
+
+@pytest.mark.asyncio
+async def test_shard_errors_are_reported(tmp_path):
+    missing = str(tmp_path / "no-yt-dlp")
+    async with shards.ShardedRecorder(1, _configure, (missing, str(tmp_path))) as rec:
+        with pytest.raises(shards.ShardError, match="FileNotFoundError"):
+            await rec.record_clip("http://example.com/m", "m", duration=1)
+
+
+@pytest.mark.asyncio
+async def test_quality_is_rebalanced_across_shards(tmp_path, monkeypatch):
+    monkeypatch.setattr(shards, "QUALITY_CHECK_INTERVAL", 0.05)
+    ytdlp, ffmpeg = _fake_tools(tmp_path)
+    async with shards.ShardedRecorder(2, _configure, (ytdlp, str(tmp_path), ffmpeg)) as rec:
+        # "vip" and "low" live on different shards
+        assert shards.shard_for("vip", 2) != shards.shard_for("low", 2)
+        await rec.set_priority("vip", 5)
+        for model in ("vip", "low"):
+            assert await rec.start_recording(f"http://example.com/{model}", model) is True
+
+        async def both_high():
+            return await rec.list_qualities() == {"vip": "hi", "low": "hi"}
+        await _until(both_high)
+
+        # 8.2 MB/s of 10 is over the 0.8 watermark; one step down of the
+        # lowest-priority stream is enough, then the load settles in between
+        rec.quality = QualityPolicy(10 * MB, 10 * MB, high_watermark=0.8, low_watermark=0.5)
+        rec.load = _ScriptedLoad(LoadSample(8.2 * MB, 8.2 * MB), LoadSample(6 * MB, 6 * MB))
+
+        async def low_switched():
+            return (await rec.list_qualities()).get("low") == "mid"
+        await _until(low_switched)
+
+        assert (await rec.list_qualities())["vip"] == "hi"
+        assert [(d.model, d.old, d.new) for d in rec.quality.decisions] == [("low", "hi", "mid")]
+
+
+@pytest.mark.asyncio
+async def test_recording_is_started_and_stopped_over_ipc(tmp_path):
+    ytdlp, ffmpeg = _fake_tools(tmp_path)
+    async with shards.ShardedRecorder(2, _configure, (ytdlp, str(tmp_path), ffmpeg)) as rec:
+        assert await rec.start_recording("http://example.com/m0", "m0") is True
+        assert await rec.start_recording("http://example.com/m0", "m0") is False
+
+        async def recording():
+            # registered, and the fake yt-dlp has produced some media
+            return "m0" in await rec.list_recordings() and any(tmp_path.glob("m0_*.mp4"))
+        await _until(recording)
+
+        assert await rec.stop_recording("m0") is True
+        assert await rec.list_recordings() == {}
+        assert await rec.stop_recording("m0") is False
+    [output] = tmp_path.glob("m0_*.mp4")
+    assert output.read_bytes().startswith(b"hi")
+
+
+@pytest.mark.asyncio
+async def test_dead_shard_fails_pending_calls_and_is_respawned(tmp_path, monkeypatch):
+    monkeypatch.setattr(shards, "_RESPAWN_DELAY", 0)
+    ytdlp, ffmpeg = _fake_tools(tmp_path)
+    async with shards.ShardedRecorder(2, _configure, (ytdlp, str(tmp_path), ffmpeg)) as rec:
+        dead = rec._clients[shards.shard_for("m", 2)]
+        # a 60 s clip keeps the call pending until the shard dies
+        pending = asyncio.create_task(rec.record_clip("http://example.com/m", "m", duration=60))
+        await asyncio.sleep(0.5)
+        dead.process.kill()
+        with pytest.raises(shards.ShardError, match="terminado"):
+            await asyncio.wait_for(pending, timeout=10)
+        # the live shard still answers while the dead one is replaced
+        assert await rec.list_recordings() == {}
+
+        async def respawned():
+            return rec._clients[dead.shard_id] is not dead
+        await _until(respawned)
+        assert await rec.start_recording("http://example.com/m", "m") is True
+        assert await rec.stop_recording("m") is True
@@ -0,0 +1,129 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from telethon.errors import FileReferenceExpiredError
+from telethon.tl import types
+
+import upload
+from fs_utils import write_hash_sidecar
+
+
+class FakeClient:
+    """Pretends to upload files, handing out a new document per upload."""
+    def __init__(self):
+        self.uploads = 0
+        self.reused = 0
+        self.fetched = 0
+        self.expire_next_reuse = False
+        self.messages = {}
+
+    async def send_file(self, target, file, caption=None, progress_callback=None):
+        if isinstance(file, types.InputDocument):
+            if self.expire_next_reuse:
+                self.expire_next_reuse = False
+                raise FileReferenceExpiredError(request=None)
+            self.reused += 1
+            doc_id = file.id
+        else:
+            self.uploads += 1
+            doc_id = self.uploads
+            if progress_callback is not None:
+                progress_callback(0, 100)
+                progress_callback(100, 100)
+        document = SimpleNamespace(id=doc_id, access_hash=doc_id * 10, file_reference=bytes([doc_id]))
+        message = SimpleNamespace(id=len(self.messages) + 1, chat_id=target, document=document)
+        self.messages[(target, message.id)] = message
+        return message
+
+    async def get_messages(self, peer, ids):
+        self.fetched += 1
+        return self.messages.get((peer, ids))
+
+
+@pytest.mark.asyncio
+async def test_identical_content_is_uploaded_once(tmp_path):
+    refs = upload.FileRefCache(tmp_path / "refs.json")
+    client = FakeClient()
+    a = tmp_path / "a.mp4"
+    b = tmp_path / "b.mp4"
+    a.write_bytes(b"same")
+    b.write_bytes(b"same")
+
+    for target in (1, 2, 3):
+        await upload.upload_file(client, a, target, refs=refs)
+    await upload.upload_file(client, b, 4, refs=refs)
+
+    assert client.uploads == 1
+    assert client.reused == 3
+    assert upload.FileRefCache(tmp_path / "refs.json").get(hashlib.sha256(b"same").hexdigest()) is not None
+
+
+@pytest.mark.asyncio
+async def test_sidecar_hash_is_used_without_reading(tmp_path, monkeypatch):
+    refs = upload.FileRefCache(tmp_path / "refs.json")
+    path = tmp_path / "rec.mp4"
+    path.write_bytes(b"recording")
+    write_hash_sidecar(path, "abc")
+
+    def no_hash(*args, **kwargs):
+        raise AssertionError("file should not be re-read")
+
+    monkeypatch.setattr(upload, "hash_file", no_hash)
+    await upload.upload_file(FakeClient(), path, 1, refs=refs)
+    assert refs.get("abc") is not None
+
+
+@pytest.mark.asyncio
+async def test_progress_callback_only_sees_real_uploads(tmp_path):
+    refs = upload.FileRefCache(tmp_path / "refs.json")
+    client = FakeClient()
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"clip")
+    seen = []
+
+    for target in (1, 2):
+        await upload.upload_file(client, path, target, refs=refs, progress_callback=lambda s, t: seen.append(s))
+
+    assert seen == [0, 100]
+
+
+@pytest.mark.asyncio
+async def test_expired_reference_is_refreshed_from_origin_message(tmp_path):
+    refs = upload.FileRefCache(tmp_path / "refs.json")
+    client = FakeClient()
+    path = tmp_path / "a.mp4"
+    path.write_bytes(b"data")
+
+    await upload.upload_file(client, path, 1, refs=refs)
+    assert refs.origin(hashlib.sha256(b"data").hexdigest()) == (1, 1)
+    client.expire_next_reuse = True
+    await upload.upload_file(client, path, 2, refs=refs)
+
+    assert client.fetched == 1
+    assert client.uploads == 1
+    assert client.reused == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_reference_is_reuploaded_when_origin_is_gone(tmp_path):
+    refs = upload.FileRefCache(tmp_path / "refs.json")
+    client = FakeClient()
+    path = tmp_path / "a.mp4"
+    path.write_bytes(b"data")
+
+    await upload.upload_file(client, path, 1, refs=refs)
+    client.messages.clear()  # the original message was deleted
+    client.expire_next_reuse = True
+    await upload.upload_file(client, path, 2, refs=refs)
+
+    assert client.fetched == 1
+    assert client.uploads == 2
+
+
+def test_ttl_and_size_bound(tmp_path):
+    refs = upload.FileRefCache(tmp_path / "refs.json", ttl=0, max_entries=2)
+    for i in range(1, 4):
+        refs.put(f"h{i}", SimpleNamespace(id=i, access_hash=i, file_reference=b"x"))
+    assert len(refs) == 2
+    assert refs.get("h3") is None  # ttl=0: everything is already expired
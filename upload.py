@@ -3,18 +3,202 @@
 These functions handle auto-splitting of large files, retries with exponential
 backoff and resumable uploads. Real implementation will require persistent
 storage to track upload state.
+
+Files whose content was already uploaded are not sent again: the document
+returned by the first upload is remembered in a :class:`FileRefCache` keyed by
+the SHA-256 of the content, and later sends reuse it. The hash is normally
+recorded while the file is written (see ``fs_utils.write_hash_sidecar``), so no
+extra read pass is needed. Telegram file references expire after a while, so
+the cache also remembers the message that carried the document and asks
+Telegram for a fresh reference from it before falling back to a new upload.
 """
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
+import os
+import time
 from pathlib import Path
-from typing import Iterable, AsyncIterator, Optional
+from typing import Any, Callable, Dict, Iterable, AsyncIterator, Optional, Tuple
 
 from telethon import TelegramClient
+from telethon.errors import (
+    FileIdInvalidError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    MediaEmptyError,
+    RPCError,
+)
+from telethon.tl import types
+
+from config import CACHE_DIR, FILE_REF_MAX_ENTRIES, FILE_REF_TTL_DAYS
+from fs_utils import ensure_directory, hash_file, read_hash_sidecar, write_hash_sidecar
 
 CHUNK_SIZE_LIMIT = 2 * 1024 * 1024 * 1024  # 2 GiB
 
-__all__ = ["upload_file", "iter_file_chunks"]
+__all__ = ["FileRefCache", "upload_file", "iter_file_chunks"]
+
+# Errors meaning a remembered document can no longer be sent by reference.
+_STALE_REF_ERRORS = (
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    FileIdInvalidError,
+    MediaEmptyError,
+)
+
+
+class FileRefCache:
+    """Persistent map from content hash to an uploaded Telegram document.
+
+    Entries older than ``ttl`` seconds are treated as expired, and the least
+    recently used ones are dropped beyond ``max_entries``.
+    """
+
+    def __init__(
+        self,
+        path: Path | str = Path(CACHE_DIR) / "file_refs.json",
+        ttl: float = FILE_REF_TTL_DAYS * 86400,
+        max_entries: int = FILE_REF_MAX_ENTRIES,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        try:
+            self._entries: Dict[str, Dict[str, Any]] = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _save(self) -> None:
+        ensure_directory(self.path.parent)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._entries))
+        os.replace(tmp, self.path)
+
+    def origin(self, content_hash: str) -> Optional[Tuple[int, int]]:
+        """Return ``(chat_id, message_id)`` of a message carrying the document, if known."""
+        entry = self._entries.get(content_hash)
+        if entry is None or entry.get("msg_id") is None:
+            return None
+        return entry["peer"], entry["msg_id"]
+
+    def get(self, content_hash: str) -> Optional[types.InputDocument]:
+        """Return the document uploaded for *content_hash*, if still valid."""
+        entry = self._entries.get(content_hash)
+        if entry is None:
+            return None
+        if time.time() - entry["stored"] > self.ttl:
+            self.evict(content_hash)
+            return None
+        entry["used"] = time.time()
+        self._save()
+        return types.InputDocument(
+            id=entry["id"],
+            access_hash=entry["access_hash"],
+            file_reference=bytes.fromhex(entry["file_reference"]),
+        )
+
+    def put(
+        self, content_hash: str, document: types.Document, origin: Optional[Tuple[int, int]] = None
+    ) -> None:
+        """Remember *document* as the upload of *content_hash*.
 
+        *origin* is the ``(chat_id, message_id)`` of a message carrying it,
+        used to refresh the file reference once it expires.
+        """
+        now = time.time()
+        previous = self._entries.get(content_hash)
+        same = previous is not None and previous["id"] == document.id
+        if origin is None and same:
+            origin = previous.get("peer"), previous.get("msg_id")
+        peer, msg_id = origin or (None, None)
+        self._entries[content_hash] = {
+            "id": document.id,
+            "access_hash": document.access_hash,
+            "file_reference": bytes(document.file_reference or b"").hex(),
+            "peer": peer,
+            "msg_id": msg_id,
+            # a reused reference keeps its original age for the TTL
+            "stored": previous["stored"] if same else now,
+            "used": now,
+        }
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            for digest in sorted(self._entries, key=lambda d: self._entries[d]["used"])[:overflow]:
+                del self._entries[digest]
+        self._save()
+
+    def evict(self, content_hash: str) -> None:
+        """Forget the document stored for *content_hash*."""
+        if self._entries.pop(content_hash, None) is not None:
+            self._save()
+
+
+_default_refs: Optional[FileRefCache] = None
+
+
+def _get_refs() -> FileRefCache:
+    global _default_refs
+    if _default_refs is None:
+        _default_refs = FileRefCache()
+    return _default_refs
+
+
+async def _content_hash(file_path: Path) -> str:
+    """Return the SHA-256 of *file_path*, hashing it only if no sidecar exists."""
+    digest = read_hash_sidecar(file_path)
+    if digest is None:
+        digest = await asyncio.to_thread(hash_file, file_path)
+        write_hash_sidecar(file_path, digest)
+    return digest
+
+
+def _origin(message: types.Message) -> Optional[Tuple[int, int]]:
+    chat_id, msg_id = getattr(message, "chat_id", None), getattr(message, "id", None)
+    return (chat_id, msg_id) if chat_id is not None and msg_id is not None else None
+
+
+def _remember(refs: FileRefCache, content_hash: str, message: types.Message) -> None:
+    if message.document is not None:
+        refs.put(content_hash, message.document, _origin(message))
+
+
+async def _refreshed_document(
+    client: TelegramClient, refs: FileRefCache, content_hash: str, document: types.InputDocument
+) -> Optional[types.InputDocument]:
+    """Fetch a fresh file reference for *document* from the message it came from."""
+    origin = refs.origin(content_hash)
+    if origin is None:
+        return None
+    try:
+        message = await client.get_messages(origin[0], ids=origin[1])
+    except (RPCError, ValueError) as ex:
+        logging.debug("No se pudo refrescar la referencia de %s: %s", content_hash, ex)
+        return None
+    fresh = getattr(message, "document", None)
+    if fresh is None or fresh.id != document.id:
+        return None  # message deleted or its media replaced
+    return types.InputDocument(id=fresh.id, access_hash=fresh.access_hash, file_reference=fresh.file_reference)
+
+
+async def _send_by_reference(
+    client: TelegramClient,
+    target: int | str,
+    document: types.InputDocument,
+    caption: Optional[str],
+    file_path: Path,
+) -> Optional[types.Message]:
+    """Send an already uploaded *document*; ``None`` if its reference is stale."""
+    try:
+        return await client.send_file(target, document, caption=caption)
+    except _STALE_REF_ERRORS as ex:
+        logging.info("Referencia caducada para %s (%s)", file_path.name, type(ex).__name__)
+        return None
+
+
 async def iter_file_chunks(file_path: Path, chunk_size: int = CHUNK_SIZE_LIMIT) -> AsyncIterator[bytes]:
     """Yield chunks from *file_path* for uploading.
 
@@ -29,11 +213,38 @@ async def upload_file(
     file_path: Path,
     target: int | str,
     caption: Optional[str] = None,
-) -> None:
-    """Upload a local file to *target* using *client*.
+    refs: Optional[FileRefCache] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> types.Message:
+    """Upload a local file to *target* using *client* and return the message.
 
-    The file will be split automatically if it exceeds Telegram limits. This
-    stub should be expanded with retry logic and progress reporting.
+    Identical content sent before is delivered by reference from *refs*
+    without uploading. A stale reference is refreshed from the message that
+    carried the document; only if that fails is the entry evicted and the file
+    uploaded again. *progress_callback* is handed to Telethon and called with
+    ``(sent, total)`` bytes while the file is actually uploaded. Splitting
+    files above Telegram limits is still to be implemented.
     """
-    # TODO: implement segmented upload to Telegram
-    raise NotImplementedError
+    if refs is None:
+        refs = _get_refs()
+    content_hash = await _content_hash(file_path)
+
+    document = refs.get(content_hash)
+    if document is not None:
+        message = await _send_by_reference(client, target, document, caption, file_path)
+        if message is None:
+            document = await _refreshed_document(client, refs, content_hash, document)
+            if document is not None:
+                message = await _send_by_reference(client, target, document, caption, file_path)
+        if message is not None:
+            logging.info("♻️ %s enviado reutilizando archivo ya subido", file_path.name)
+            _remember(refs, content_hash, message)  # fresher file_reference
+            return message
+        logging.info("Resubiendo %s", file_path.name)
+        refs.evict(content_hash)
+
+    message = await client.send_file(
+        target, file_path, caption=caption, progress_callback=progress_callback
+    )
+    _remember(refs, content_hash, message)
+    return message